@@ -1,23 +1,29 @@
 """Defines the executable script for a running game."""
 
+import os
+import sys
 from modules import chessboard, computer, constants, game, pieces, player
 
+BOOK = 'book.bin' if os.path.exists('book.bin') else None  # Opening book built with modules.book, if present
+TABLEBASES = 'tablebases' if os.path.isdir('tablebases') else None  # Endgame tables built with modules.tablebase, if present
+FEN = ' '.join(sys.argv[1:]) or None  # Starting position, if given on the command line
+
 print("\nChess\n")
 NUM_PLAYERS = int(input("How many players? (1/2): "))  # Number of players
 if NUM_PLAYERS == 1:  # 1-player game (against computer)
     P1_TEAM = input("P1 is White or Black? (w/b): ").lower()  # P1's team selection
     P1_TEAM = constants.TEAM_WHITE if P1_TEAM == 'w' else constants.TEAM_BLACK  # Reformat selection
     if P1_TEAM == constants.TEAM_WHITE:
-        P1 = player.Player(constants.TEAM_WHITE, pieces.white_set, True)
-        P2 = computer.Computer(constants.TEAM_BLACK, pieces.black_set)
+        P1 = player.Player(constants.TEAM_WHITE, pieces.new_set(constants.TEAM_WHITE), True)
+        P2 = computer.Computer(constants.TEAM_BLACK, pieces.new_set(constants.TEAM_BLACK), book=BOOK, tablebases=TABLEBASES, ponder=True)
     else:
-        P1 = computer.Computer(constants.TEAM_BLACK, pieces.black_set, True)
-        P2 = computer.Computer(constants.TEAM_WHITE, pieces.white_set)
-    G = game.Game(P1, P2, chessboard.ChessBoard())  # New game
+        P1 = computer.Computer(constants.TEAM_BLACK, pieces.new_set(constants.TEAM_BLACK), True)
+        P2 = computer.Computer(constants.TEAM_WHITE, pieces.new_set(constants.TEAM_WHITE), book=BOOK, tablebases=TABLEBASES, ponder=True)
+    G = game.Game(P1, P2, chessboard.ChessBoard(), FEN)  # New game
     G.play_one()  # Play
 else:  # 2-player game
-    P1 = player.Player(constants.TEAM_WHITE, pieces.white_set, True)
-    P2 = player.Player(constants.TEAM_BLACK, pieces.black_set)
-    G = game.Game(P1, P2, chessboard.ChessBoard())  # New game
+    P1 = player.Player(constants.TEAM_WHITE, pieces.new_set(constants.TEAM_WHITE), True)
+    P2 = player.Player(constants.TEAM_BLACK, pieces.new_set(constants.TEAM_BLACK))
+    G = game.Game(P1, P2, chessboard.ChessBoard(), FEN)  # New game
     G.play_two()  # Play
 G.report()  # Report winner
@@ -0,0 +1,146 @@
+"""Defines the opening book.
+
+A book is a binary file of fixed-size records (position key, move, weight),
+sorted by key then move, so it can be searched in place through mmap without
+parsing it first. Keys are the board's Zobrist keys: a book has to be rebuilt
+whenever the keys change.
+
+Run `python3 -m modules.book BOOK GAMES.pgn [GAMES.pgn ...]` to compile a book
+from local PGN files.
+"""
+
+import mmap
+import re
+import struct
+from argparse import ArgumentParser
+from bisect import bisect_left
+from collections import Counter
+from random import choices
+from .chessboard import ChessBoard
+from .constants import *
+from .pieces import new_set
+
+RECORD = struct.Struct('>QHH')  # Key, move, weight; big-endian so records sort as bytes
+SAN_PIECES = {letter: kind for kind, letter in PIECE_LETTERS.items() if kind != PAWN}
+
+class OpeningBook:
+    """A read-only opening book, searched in place."""
+
+    def __init__(self, path):
+        """Map a book file into memory."""
+        self.file = open(path, 'rb')
+        self.size = len(self)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+
+    def __len__(self):
+        """Return the number of records in the book."""
+        self.file.seek(0, 2)
+        return self.file.tell() // RECORD.size
+
+    def __getitem__(self, index):
+        """Return the key of a record, so the book can be bisected like a sorted list."""
+        return RECORD.unpack_from(self.map, index * RECORD.size)[0]
+
+    def close(self):
+        """Release the book file."""
+        if self.size:
+            self.map.close()
+        self.file.close()
+
+    def lookup(self, key):
+        """Return the (move, weight) records of a position."""
+        entries = []
+        index = bisect_left(self, key, 0, self.size)
+        while index < self.size:
+            record_key, move, weight = RECORD.unpack_from(self.map, index * RECORD.size)
+            if record_key != key:
+                break
+            entries.append((move, weight))
+            index += 1
+        return entries
+
+    def choose(self, board):
+        """Pick a book move for the position by weight, or None when out of book."""
+        legal = set(board.legal_moves(board.side))
+        entries = [(move, weight) for move, weight in self.lookup(board.key) if move in legal]
+        if not entries:
+            return None
+        moves, weights = zip(*entries)
+        return choices(moves, weights)[0]
+
+# PGN
+def read_games(path):
+    """Read the move text of each game in a PGN file as a list of SAN tokens."""
+    with open(path, encoding='utf-8', errors='replace') as file:
+        text = file.read()
+    games = []
+    for movetext in re.split(r'(?:^\[.*\]\s*$\n?)+', text, flags=re.MULTILINE):
+        movetext = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', movetext)  # Comments
+        while re.search(r'\([^()]*\)', movetext):  # Variations, innermost first
+            movetext = re.sub(r'\([^()]*\)', ' ', movetext)
+        tokens = [
+            token for token in movetext.split()
+            if not re.fullmatch(r'\d+\.+|\$\d+|1-0|0-1|1/2-1/2|\*', token)
+        ]
+        tokens = [re.sub(r'^\d+\.+', '', token) for token in tokens]
+        if tokens:
+            games.append(tokens)
+    return games
+
+def parse_san(board, san):
+    """Find the legal move named by a SAN token, or None if there is none."""
+    san = san.rstrip('+#!?')
+    home = 0 if board.side == WHITE else BOARD_SIZE - BOARD_WIDTH
+    if san in ('O-O', '0-0'):
+        want_fr, want_to, kind, hint, promotion = home + 4, home + 6, KING, '', EMPTY
+    elif san in ('O-O-O', '0-0-0'):
+        want_fr, want_to, kind, hint, promotion = home + 4, home + 2, KING, '', EMPTY
+    else:
+        san, _, promoted = san.partition('=')
+        promotion = SAN_PIECES.get(promoted, EMPTY)
+        if promoted and promotion in (EMPTY, KING):
+            return None
+        kind = SAN_PIECES.get(san[:1], PAWN)
+        if kind != PAWN:
+            san = san[1:]
+        want_to = SQUARES.get(san[-2:])
+        if want_to is None:
+            return None
+        want_fr, hint = None, san[:-2].replace('x', '')
+    matches = []
+    for move in board.legal_moves(board.side):
+        fr, to = move & 63, move >> 6 & 63
+        if to != want_to or move >> 12 != promotion or board.squares[fr] & KIND_MASK != kind or want_fr not in (None, fr):
+            continue
+        if all(SQUARE_NAMES[fr][0] == c if c in FILE_LETTERS else SQUARE_NAMES[fr][1] == c for c in hint):
+            matches.append(move)
+    return matches[0] if len(matches) == 1 else None
+
+# BUILD
+def build(book_path, pgn_paths, max_plies=20, min_count=2):
+    """Compile the opening moves of PGN games into a book; return the number of records written."""
+    counts = Counter()
+    for path in pgn_paths:
+        for tokens in read_games(path):
+            board = ChessBoard()
+            board.setup(new_set(TEAM_WHITE), new_set(TEAM_BLACK))
+            for token in tokens[:max_plies]:
+                move = parse_san(board, token)
+                if move is None:  # Unreadable move: the rest of the game is out of reach
+                    break
+                counts[board.key, move] += 1
+                board.make_move(move)
+    records = sorted((key, move, min(count, 0xFFFF)) for (key, move), count in counts.items() if count >= min_count)
+    with open(book_path, 'wb') as file:
+        for record in records:
+            file.write(RECORD.pack(*record))
+    return len(records)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Compile an opening book from PGN games.")
+    parser.add_argument('book', help="book file to write")
+    parser.add_argument('pgn', nargs='+', help="PGN files to read")
+    parser.add_argument('--plies', type=int, default=20, help="plies of each game to keep")
+    parser.add_argument('--min-count', type=int, default=2, help="fewest games a move must appear in")
+    args = parser.parse_args()
+    print(f"{build(args.book, args.pgn, args.plies, args.min_count)} records written to {args.book}")
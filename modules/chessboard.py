@@ -1,7 +1,113 @@
 """Defines the chessboard."""
 
-from itertools import chain, zip_longest
+from random import Random
 from .constants import *
+from .pieces import Bishop, King, Knight, Pawn, PieceSet, Queen, Rook
+
+def _walk(square, df, dr, slides):
+    """List the squares reached from a square by repeating a (file, rank) step."""
+    file, rank = (square & 7) + df, (square >> 3) + dr
+    path = []
+    while 0 <= file < 8 and 0 <= rank < 8:
+        path.append(rank * 8 + file)
+        if not slides:
+            break
+        file, rank = file + df, rank + dr
+    return path
+
+# Attack tables, built once from the pieces' steps and indexed by square
+KNIGHT_ATTACKS = [[to for df, dr in Knight.ACTIONS for to in _walk(sq, df, dr, Knight.SLIDES)] for sq in range(BOARD_SIZE)]
+KING_ATTACKS = [[to for df, dr in King.ACTIONS for to in _walk(sq, df, dr, King.SLIDES)] for sq in range(BOARD_SIZE)]
+PAWN_ATTACKS = {  # Indexed by the pawn's side
+    side: [[to for df, dr in Pawn.ACTIONS if df for to in _walk(sq, df, dr * forward, Pawn.SLIDES)] for sq in range(BOARD_SIZE)]
+    for side, forward in ((WHITE, 1), (BLACK, -1))
+}
+ROOK_RAYS = [[ray for df, dr in Rook.ACTIONS if (ray := _walk(sq, df, dr, Rook.SLIDES))] for sq in range(BOARD_SIZE)]
+BISHOP_RAYS = [[ray for df, dr in Bishop.ACTIONS if (ray := _walk(sq, df, dr, Bishop.SLIDES))] for sq in range(BOARD_SIZE)]
+QUEEN_RAYS = [rook + bishop for rook, bishop in zip(ROOK_RAYS, BISHOP_RAYS)]
+LINES = [{to: ray for ray in QUEEN_RAYS[sq] for to in ray} for sq in range(BOARD_SIZE)]  # Ray from a square through another
+STEPS = {KNIGHT: KNIGHT_ATTACKS, KING: KING_ATTACKS}  # Indexed by piece kind
+RAYS = {BISHOP: BISHOP_RAYS, ROOK: ROOK_RAYS, QUEEN: QUEEN_RAYS}  # Indexed by piece kind
+PIECE_CLASSES = {piece.CODE: piece for piece in (Pawn, Knight, Bishop, Rook, Queen, King)}  # Indexed by piece kind
+WEIGHTS = [0] * 8  # Piece weights, indexed by piece kind
+for piece in PIECE_CLASSES.values():
+    WEIGHTS[piece.CODE] = piece.WEIGHT
+
+def bit_squares(bits):
+    """List the squares of the bits set in a bitboard."""
+    squares = []
+    while bits:
+        low = bits & -bits
+        squares.append(low.bit_length() - 1)
+        bits ^= low
+    return squares
+
+def piece_attacks(squares, fr):
+    """List the squares the piece on a square attacks, up to and including the first piece on each line."""
+    code = squares[fr]
+    kind = code & KIND_MASK
+    if kind == PAWN:
+        return PAWN_ATTACKS[code & BLACK][fr]
+    if kind in STEPS:
+        return STEPS[kind][fr]
+    targets = []
+    for ray in RAYS[kind][fr]:
+        for to in ray:
+            targets.append(to)
+            if squares[to] != EMPTY:
+                break
+    return targets
+
+# Castling: the right, King move and Rook move of each castle, by side
+CASTLES = {
+    WHITE: (
+        (WHITE_KINGSIDE, SQUARES['e1'], SQUARES['g1'], SQUARES['h1'], SQUARES['f1']),
+        (WHITE_QUEENSIDE, SQUARES['e1'], SQUARES['c1'], SQUARES['a1'], SQUARES['d1']),
+    ),
+    BLACK: (
+        (BLACK_KINGSIDE, SQUARES['e8'], SQUARES['g8'], SQUARES['h8'], SQUARES['f8']),
+        (BLACK_QUEENSIDE, SQUARES['e8'], SQUARES['c8'], SQUARES['a8'], SQUARES['d8']),
+    ),
+}
+CASTLING_ROOKS = {king_to: (rook_fr, rook_to) for castles in CASTLES.values() for _, _, king_to, rook_fr, rook_to in castles}
+# Rights kept by a move touching a square: moving or capturing on a King or Rook home square loses its rights
+CASTLING_KEPT = [15] * BOARD_SIZE
+for castles in CASTLES.values():
+    for right, king_fr, _, rook_fr, _ in castles:
+        CASTLING_KEPT[king_fr] &= ~right
+        CASTLING_KEPT[rook_fr] &= ~right
+
+# Piece values from White's point of view, indexed by piece code then square,
+# in tenths of a weight: material plus the piece's square table
+WEIGHT_SCALE = 10
+VALUES = [[0] * BOARD_SIZE for _ in range(16)]
+for piece in (Pawn, Knight, Bishop, Rook, Queen, King):
+    for square in range(BOARD_SIZE):
+        VALUES[piece.CODE | WHITE][square] = piece.WEIGHT * WEIGHT_SCALE + piece.SQUARE_TABLE[square ^ 56]
+        VALUES[piece.CODE | BLACK][square] = -(piece.WEIGHT * WEIGHT_SCALE + piece.SQUARE_TABLE[square])
+
+# Zobrist keys, indexed by piece code then square (fixed seed so keys are stable across runs)
+_random = Random(2023)
+ZOBRIST_PIECES = [
+    [0 if code & KIND_MASK == EMPTY else _random.getrandbits(64) for _ in range(BOARD_SIZE)]
+    for code in range(16)
+]
+ZOBRIST_SIDE = _random.getrandbits(64)
+ZOBRIST_CASTLING = [0] + [_random.getrandbits(64) for _ in range(15)]  # Indexed by castling rights
+ZOBRIST_EP = [_random.getrandbits(64) for _ in range(BOARD_WIDTH)]  # Indexed by en passant file
+
+def encode_move(fr, to, promotion=EMPTY):
+    """Pack a move into an integer."""
+    return fr | to << 6 | promotion << 12
+
+def decode_move(move):
+    """Unpack a move into its from and to squares."""
+    return move & 63, move >> 6 & 63
+
+def move_name(move):
+    """Name a move in coordinate notation, e.g. e2e4 or e7e8q."""
+    promotion = move >> 12
+    return SQUARE_NAMES[move & 63] + SQUARE_NAMES[move >> 6 & 63] + (PIECE_LETTERS[promotion].lower() if promotion else '')
 
 class ChessBoard():
     """The chessboard."""
@@ -12,28 +118,43 @@ class ChessBoard():
     BOARD_WIDTH = BOARD_WIDTH
 
     @staticmethod
-    def _file_to_index(file):
-        """Convert a file letter to an index."""
-        return ord(file.lower()) - 97
-
-    @staticmethod
-    def _pos_to_int(pos):
-        """Convert a board position to an integer."""
-        return ord(pos[0]) + int(pos[1])
+    def _pathway(fr, to, name):
+        """Compute the squares strictly between two positions along a piece's line of movement."""
+        file_dist = (to & 7) - (fr & 7)
+        rank_dist = (to >> 3) - (fr >> 3)
+        straight = file_dist == 0 or rank_dist == 0
+        diagonal = abs(file_dist) == abs(rank_dist)
+        if (name in ('Rook', 'Queen') and straight) or (name in ('Bishop', 'Queen') and diagonal):
+            distance = max(abs(file_dist), abs(rank_dist))
+            if distance > 1:
+                step = (to - fr) // distance
+                return list(range(fr + step, to, step))
+        return None
 
     def __init__(self):
         """Initialize the board."""
-        self.matrix = [
-            [None for _ in range(ChessBoard.BOARD_WIDTH)] for _ in range(ChessBoard.BOARD_WIDTH)
-        ]
+        self.squares = [EMPTY] * BOARD_SIZE  # Piece codes, indexed by square
+        self.occupants = [None] * BOARD_SIZE  # Piece objects, indexed by square
+        self.side = WHITE  # Side to move
+        self.castling = 0  # Castling rights still held, as bits
+        self.ep = None  # Square a pawn may capture onto en passant, if any
+        self.halfmove = 0  # Plies since the last capture or pawn move
+        self.fullmove = 1  # Move number, counted up after Black moves
+        # Undo stack of (move, moved piece, captured piece, key, score, castling, ep, halfmove, attacks, pawn key)
+        self.history = []
+        self.key = 0  # Zobrist key of the position
+        self.pawn_key = 0  # Zobrist key of the pawns alone, for caching pawn structure
+        self.score = 0  # Material and placement from White's point of view
+        self.attacks = [0] * 2 * BOARD_SIZE  # Bitboard of the pieces attacking each square, indexed by side << 3 | square
 
     # BOARD DISPLAY
-    def display(self):
-        """Display the board."""
+    def display(self, team=TEAM_WHITE):
+        """Display the board, with the given team's side nearest the viewer."""
         print("\n")
-        for rank, row in enumerate(self.matrix):
+        ranks = reversed(range(BOARD_WIDTH)) if team == TEAM_WHITE else range(BOARD_WIDTH)
+        for rank in ranks:
             print(rank + 1, end=' | ')
-            for piece in row:
+            for piece in self.occupants[rank * BOARD_WIDTH:(rank + 1) * BOARD_WIDTH]:
                 print(" . " if piece is None else piece, end=' ')
             print("\n")
         print("     ", end='')
@@ -43,651 +164,597 @@ class ChessBoard():
 
     def get(self, pos):
         """Get a piece off the board."""
-        file, rank = pos
-        return self.matrix[int(rank) - 1][ChessBoard._file_to_index(file)]
-
-    def get_attack_points(self, proponent, neighbourhood, king):
-        """Compute the lines of fire aiming at a King."""
-        attack_points = set()
-        for neighbour in neighbourhood:
-            if self.get(neighbour) is None:
-                to_file, to_rank = neighbour
-                # Pawn, Knight, King
-
-        to_file, to_rank = king.pos
-        for piece in chain(*proponent.pieces.values()):
-            fr_file, fr_rank = piece.pos
-            file_dist = ord(to_file) - ord(fr_file)
-            rank_dist = int(to_rank) - int(fr_rank)
-            action = abs(file_dist), abs(rank_dist)
-            if piece.name == 'Pawn':
-                if proponent == 0:
-                    if to_rank > fr_rank:
+        return self.occupants[pos]
+
+    # ATTACKS
+    def is_square_attacked(self, square, side):
+        """Determine if any piece of a side attacks a square."""
+        return self.attacks[side << 3 | square] > 0
+
+    def attackers(self, square, side):
+        """List the squares of a side's pieces that attack a square."""
+        return bit_squares(self.attacks[side << 3 | square])
+
+    def pins(self, king, side):
+        """Map each of a side's pieces pinned to its King to the squares it may still move to, along the pin."""
+        squares = self.squares
+        enemy = side ^ BLACK
+        pinned = {}
+        for rays, slider in ((ROOK_RAYS[king], ROOK | enemy), (BISHOP_RAYS[king], BISHOP | enemy)):
+            for ray in rays:
+                shield = None
+                for index, sq in enumerate(ray):
+                    code = squares[sq]
+                    if code == EMPTY:
                         continue
-                else:
-                    if to_rank < fr_rank:
+                    if shield is None and code & BLACK == side:
+                        shield = sq  # The first piece out from the King is its own: pinned if a slider stands behind
                         continue
-            else:
-                # Initialize pathway.
-                pathway = None
-                # Match by piece.
-                match piece.name:
-                    # Determine vertical/horizontal pathway.
-                    case 'Rook':
-                        if file_dist == 0:
-                            rank_path = list(range(
-                                min(int(fr_rank), int(to_rank)),
-                                max(int(fr_rank), int(to_rank))
-                            ))
-                            if len(rank_path) > 0:
-                                pathway = zip_longest(fr_file, rank_path, fillvalue=fr_file)
-                        elif rank_dist == 0:
-                            file_path = list(chr(file) for file in range(
-                                min(ord(fr_file), ord(to_file)),
-                                max(ord(fr_file), ord(to_file))
-                            ))
-                            if len(file_path) > 0:
-                                pathway = zip_longest(file_path, fr_rank, fillvalue=fr_rank)
-
-                    # Determine diagonal pathway.
-                    case 'Bishop':
-                        if abs(file_dist) == abs(rank_dist):
-                            if int(fr_rank) < int(to_rank):
-                                rank_path = list(range(
-                                    min(int(fr_rank), int(to_rank)),
-                                    max(int(fr_rank), int(to_rank))
-                                ))
-                            else:
-                                rank_path = list(range(
-                                    max(int(fr_rank), int(to_rank)),
-                                    min(int(fr_rank), int(to_rank)), -1
-                                ))
-                            if ord(fr_file) < ord(to_file):
-                                file_path = list(chr(file) for file in range(
-                                    min(ord(fr_file), ord(to_file)),
-                                    max(ord(fr_file), ord(to_file))
-                                ))
-                            else:
-                                file_path = list(chr(file) for file in range(
-                                    max(ord(fr_file), ord(to_file)),
-                                    min(ord(fr_file), ord(to_file)), -1
-                                ))
-                            if len(rank_path) > 0 and len(file_path) > 0:
-                                pathway = zip(file_path, rank_path)
-
-                    # Determine any pathway.
-                    case 'Queen':
-                        if file_dist == 0:
-                            rank_path = list(range(
-                                min(int(fr_rank), int(to_rank)),
-                                max(int(fr_rank), int(to_rank))
-                            ))
-                            if len(rank_path) > 0:
-                                pathway = zip_longest(fr_file, rank_path, fillvalue=fr_file)
-                        elif rank_dist == 0:
-                            file_path = list(chr(file) for file in range(
-                                min(ord(fr_file), ord(to_file)),
-                                max(ord(fr_file), ord(to_file))
-                            ))
-                            if len(file_path) > 0:
-                                pathway = zip_longest(file_path, fr_rank, fillvalue=fr_rank)
-                        elif abs(file_dist) == abs(rank_dist):
-                            if int(fr_rank) < int(to_rank):
-                                rank_path = list(range(
-                                    min(int(fr_rank), int(to_rank)),
-                                    max(int(fr_rank), int(to_rank))
-                                ))
-                            else:
-                                rank_path = list(range(
-                                    max(int(fr_rank), int(to_rank)),
-                                    min(int(fr_rank), int(to_rank)), -1
-                                ))
-                            if ord(fr_file) < ord(to_file):
-                                file_path = list(chr(file) for file in range(
-                                    min(ord(fr_file), ord(to_file)),
-                                    max(ord(fr_file), ord(to_file))
-                                ))
-                            else:
-                                file_path = list(chr(file) for file in range(
-                                    max(ord(fr_file), ord(to_file)),
-                                    min(ord(fr_file), ord(to_file)), -1
-                                ))
-                            if len(rank_path) > 0 and len(file_path) > 0:
-                                pathway = zip(file_path, rank_path)
-
-                # Check for an obstacle in pathway.
-                if pathway is not None:
-                    pathway = set(map(lambda p: p[0] + str(p[1]), pathway))
-                    for pos in pathway:
-                        block = self.get(pos)
-                        if block is not None:
-                            continue
-                    # No obstacle, but is there a King?
-                    for neighbour in neighbourhood:
-                        if neighbour in pathway:
-                            for attack_point in pathway:
-                                attack_points.add(attack_point)
-
-            # if action in piece.actions:
-            #     attack_points.add(neighbour)
-        return attack_points
-
-    def get_neighbourhood(self, pos):
-        """Compute the neighbourhood at or around a King."""
-        neighbourhood = set()
-        fr_file, fr_rank = pos
-        for pos in BOARD_POSIT:
-            to_file, to_rank = pos
-            file_dist = ord(to_file) - ord(fr_file)
-            rank_dist = int(to_rank) - int(fr_rank)
-            distance = max(abs(file_dist), abs(rank_dist))
-            if distance <= 1:
-                neighbourhood.add(pos)
-        return set(filter(lambda p: self.get(p) is None, neighbourhood))
+                    if shield is not None and (code == slider or code == QUEEN | enemy):
+                        pinned[shield] = set(ray[:index + 1])
+                    break
+        return pinned
+
+    def exchange(self, move):
+        """Estimate the weight a capture wins: the victim, less the capturer if the square is defended."""
+        squares = self.squares
+        to = move >> 6 & 63
+        mover = squares[move & 63]
+        en_passant = to == self.ep and mover & KIND_MASK == PAWN
+        victim = squares[to ^ 8 if en_passant else to]  # En passant takes the pawn behind
+        gain = WEIGHTS[victim & KIND_MASK] + WEIGHTS[move >> 12]
+        if self.attacks[(mover & BLACK ^ BLACK) << 3 | to]:
+            gain -= WEIGHTS[move >> 12 or mover & KIND_MASK]
+        return gain
+
+    def in_check(self, side):
+        """Determine if a side's King is attacked."""
+        king = KING | side
+        return king in self.squares and self.is_square_attacked(self.squares.index(king), side ^ BLACK)
 
     # CHECK
     def king_in_check(self, proponent, opponent):
         """Determine if opposing King is in check."""
-        king = opponent.pieces['King'][0]  # Get opposing King
-        neighbourhood = self.get_neighbourhood(king.pos)  # Get neighbourhood
-        attack_points = self.get_attack_points(proponent, neighbourhood, king)  # Get first line of fire found
-        if len(attack_points) > 0:  # Line of fire exists?
-            if any(map(lambda p: p in attack_points, neighbourhood)):  # Any neighbour in line of fire?
-                # Check if another piece can defend the king
-                for attack_point in attack_points:
-                    # for neighbour in neighbourhood:
-                    #     if self.get(neighbour) is None:
-                    #         to_file, to_rank = neighbour
-                    #         # Pawn, Knight, King
-
-                    to_file, to_rank = attack_point
-                    for piece in chain(*opponent.pieces.values()):
-                        fr_file, fr_rank = piece.pos
-                        file_dist = ord(to_file) - ord(fr_file)
-                        rank_dist = int(to_rank) - int(fr_rank)
-                        action = abs(file_dist), abs(rank_dist)
-                        if piece.name == 'Pawn':
-                            if proponent == 0:
-                                if to_rank > fr_rank:
-                                    continue
-                            else:
-                                if to_rank < fr_rank:
-                                    continue
-                        else:
-                            # Initialize pathway.
-                            pathway = None
-                            # Match by piece.
-                            match piece.name:
-                                # Determine vertical/horizontal pathway.
-                                case 'Rook':
-                                    if file_dist == 0:
-                                        rank_path = list(range(
-                                            min(int(fr_rank), int(to_rank)) + 1,
-                                            max(int(fr_rank), int(to_rank)) + 1
-                                        ))
-                                        if len(rank_path) > 0:
-                                            pathway = zip_longest(fr_file, rank_path, fillvalue=fr_file)
-                                    elif rank_dist == 0:
-                                        file_path = list(chr(file) for file in range(
-                                            min(ord(fr_file), ord(to_file)) + 1,
-                                            max(ord(fr_file), ord(to_file)) + 1
-                                        ))
-                                        if len(file_path) > 0:
-                                            pathway = zip_longest(file_path, fr_rank, fillvalue=fr_rank)
-
-                                # Determine diagonal pathway.
-                                case 'Bishop':
-                                    if abs(file_dist) == abs(rank_dist):
-                                        if int(fr_rank) < int(to_rank):
-                                            rank_path = list(range(
-                                                min(int(fr_rank), int(to_rank)) + 1,
-                                                max(int(fr_rank), int(to_rank)) + 1
-                                            ))
-                                        else:
-                                            rank_path = list(range(
-                                                max(int(fr_rank), int(to_rank)) - 1,
-                                                min(int(fr_rank), int(to_rank)) - 1, -1
-                                            ))
-                                        if ord(fr_file) < ord(to_file):
-                                            file_path = list(chr(file) for file in range(
-                                                min(ord(fr_file), ord(to_file)) + 1,
-                                                max(ord(fr_file), ord(to_file)) + 1
-                                            ))
-                                        else:
-                                            file_path = list(chr(file) for file in range(
-                                                max(ord(fr_file), ord(to_file)) - 1,
-                                                min(ord(fr_file), ord(to_file)) - 1, -1
-                                            ))
-                                        if len(rank_path) > 0 and len(file_path) > 0:
-                                            pathway = zip(file_path, rank_path)
-
-                                # Determine any pathway.
-                                case 'Queen':
-                                    if file_dist == 0:
-                                        rank_path = list(range(
-                                            min(int(fr_rank), int(to_rank)) + 1,
-                                            max(int(fr_rank), int(to_rank)) + 1
-                                        ))
-                                        if len(rank_path) > 0:
-                                            pathway = zip_longest(fr_file, rank_path, fillvalue=fr_file)
-                                    elif rank_dist == 0:
-                                        file_path = list(chr(file) for file in range(
-                                            min(ord(fr_file), ord(to_file)) + 1,
-                                            max(ord(fr_file), ord(to_file)) + 1
-                                        ))
-                                        if len(file_path) > 0:
-                                            pathway = zip_longest(file_path, fr_rank, fillvalue=fr_rank)
-                                    elif abs(file_dist) == abs(rank_dist):
-                                        if int(fr_rank) < int(to_rank):
-                                            rank_path = list(range(
-                                                min(int(fr_rank), int(to_rank)) + 1,
-                                                max(int(fr_rank), int(to_rank)) + 1
-                                            ))
-                                        else:
-                                            rank_path = list(range(
-                                                max(int(fr_rank), int(to_rank)) - 1,
-                                                min(int(fr_rank), int(to_rank)), -1
-                                            ))
-                                        if ord(fr_file) < ord(to_file):
-                                            file_path = list(chr(file) for file in range(
-                                                min(ord(fr_file), ord(to_file)) + 1,
-                                                max(ord(fr_file), ord(to_file)) + 1
-                                            ))
-                                        else:
-                                            file_path = list(chr(file) for file in range(
-                                                max(ord(fr_file), ord(to_file)) - 1,
-                                                min(ord(fr_file), ord(to_file)), -1
-                                            ))
-                                        if len(rank_path) > 0 and len(file_path) > 0:
-                                            pathway = zip(file_path, rank_path)
-
-                            # Check for an obstacle in pathway.
-                            blocked = False
-                            if pathway is not None:
-                                pathway = set(map(lambda p: p[0] + str(p[1]), pathway))
-                                for pos in pathway:
-                                    block = self.get(pos)
-                                    if block is not None and block.team != proponent.team:
-                                        blocked = True
-                                        break
-                                # No obstacle, but defense?
-                                if blocked and attack_point in pathway:
-                                    return False  # King can be defended
-                return True  # King in check
-        return False  # King not in check
+        return self.in_check(SIDE[opponent.team])
 
     # CHECKMATE
     def king_in_checkmate(self, proponent, opponent):
         """Determine if opposing King is in checkmate."""
-        king = opponent.pieces['King'][0]  # Get opposing King
-        neighbourhood = self.get_neighbourhood(king.pos)  # Get neighbourhood
-        attack_points = self.get_attack_points(proponent, neighbourhood, king)  # Get lines of fire
-        if len(attack_points) > 0:
-            if all(map(lambda p: p in attack_points, neighbourhood)):  # All neighbours in line of fire?
-                # Check if another piece can defend the king
-                for attack_point in attack_points:
-                    # for neighbour in neighbourhood:
-                    #     if self.get(neighbour) is None:
-                    #         to_file, to_rank = neighbour
-                    #         # Pawn, Knight, King
-
-                    to_file, to_rank = attack_point
-                    for piece in chain(*opponent.pieces.values()):
-                        fr_file, fr_rank = piece.pos
-                        file_dist = ord(to_file) - ord(fr_file)
-                        rank_dist = int(to_rank) - int(fr_rank)
-                        action = abs(file_dist), abs(rank_dist)
-                        if piece.name == 'Pawn':
-                            if proponent.near:
-                                if to_rank > fr_rank:
-                                    continue
-                            else:
-                                if to_rank < fr_rank:
-                                    continue
-                        else:
-                            # Initialize pathway.
-                            pathway = None
-                            # Match by piece.
-                            match piece.name:
-                                # Determine vertical/horizontal pathway.
-                                case 'Rook':
-                                    if file_dist == 0:
-                                        rank_path = list(range(
-                                            min(int(fr_rank), int(to_rank)) + 1,
-                                            max(int(fr_rank), int(to_rank)) + 1
-                                        ))
-                                        if len(rank_path) > 0:
-                                            pathway = zip_longest(fr_file, rank_path, fillvalue=fr_file)
-                                    elif rank_dist == 0:
-                                        file_path = list(chr(file) for file in range(
-                                            min(ord(fr_file), ord(to_file)) + 1,
-                                            max(ord(fr_file), ord(to_file)) + 1
-                                        ))
-                                        if len(file_path) > 0:
-                                            pathway = zip_longest(file_path, fr_rank, fillvalue=fr_rank)
-
-                                # Determine diagonal pathway.
-                                case 'Bishop':
-                                    if abs(file_dist) == abs(rank_dist):
-                                        if int(fr_rank) < int(to_rank):
-                                            rank_path = list(range(
-                                                min(int(fr_rank), int(to_rank)) + 1,
-                                                max(int(fr_rank), int(to_rank)) + 1
-                                            ))
-                                        else:
-                                            rank_path = list(range(
-                                                max(int(fr_rank), int(to_rank)) - 1,
-                                                min(int(fr_rank), int(to_rank)) - 1, -1
-                                            ))
-                                        if ord(fr_file) < ord(to_file):
-                                            file_path = list(chr(file) for file in range(
-                                                min(ord(fr_file), ord(to_file)) + 1,
-                                                max(ord(fr_file), ord(to_file)) + 1
-                                            ))
-                                        else:
-                                            file_path = list(chr(file) for file in range(
-                                                max(ord(fr_file), ord(to_file)) - 1,
-                                                min(ord(fr_file), ord(to_file)) - 1, -1
-                                            ))
-                                        if len(rank_path) > 0 and len(file_path) > 0:
-                                            pathway = zip(file_path, rank_path)
-
-                                # Determine any pathway.
-                                case 'Queen':
-                                    if file_dist == 0:
-                                        rank_path = list(range(
-                                            min(int(fr_rank), int(to_rank)) + 1,
-                                            max(int(fr_rank), int(to_rank)) + 1
-                                        ))
-                                        if len(rank_path) > 0:
-                                            pathway = zip_longest(fr_file, rank_path, fillvalue=fr_file)
-                                    elif rank_dist == 0:
-                                        file_path = list(chr(file) for file in range(
-                                            min(ord(fr_file), ord(to_file)) + 1,
-                                            max(ord(fr_file), ord(to_file)) + 1
-                                        ))
-                                        if len(file_path) > 0:
-                                            pathway = zip_longest(file_path, fr_rank, fillvalue=fr_rank)
-                                    elif abs(file_dist) == abs(rank_dist):
-                                        if int(fr_rank) < int(to_rank):
-                                            rank_path = list(range(
-                                                min(int(fr_rank), int(to_rank)) + 1,
-                                                max(int(fr_rank), int(to_rank)) + 1
-                                            ))
-                                        else:
-                                            rank_path = list(range(
-                                                max(int(fr_rank), int(to_rank)) - 1,
-                                                min(int(fr_rank), int(to_rank)), -1
-                                            ))
-                                        if ord(fr_file) < ord(to_file):
-                                            file_path = list(chr(file) for file in range(
-                                                min(ord(fr_file), ord(to_file)) + 1,
-                                                max(ord(fr_file), ord(to_file)) + 1
-                                            ))
-                                        else:
-                                            file_path = list(chr(file) for file in range(
-                                                max(ord(fr_file), ord(to_file)) - 1,
-                                                min(ord(fr_file), ord(to_file)), -1
-                                            ))
-                                        if len(rank_path) > 0 and len(file_path) > 0:
-                                            pathway = zip(file_path, rank_path)
-
-                            # Check for an obstacle in pathway.
-                            blocked = False
-                            if pathway is not None:
-                                pathway = set(map(lambda p: p[0] + str(p[1]), pathway))
-                                for pos in pathway:
-                                    block = self.get(pos)
-                                    if block is not None and block.team != proponent.team:
-                                        blocked = True
-                                        break
-                                # No obstacle, but defense?
-                                if blocked and attack_point in pathway:
-                                    return False  # King can be defended
-                return True  # King in checkmate
-        return False  # King not in checkmate
+        side = SIDE[opponent.team]
+        return self.in_check(side) and not self.has_legal_move(side)
+
+    # STALEMATE
+    def king_in_stalemate(self, proponent, opponent):
+        """Determine if the opposing side has no legal move while its King is not in check."""
+        side = SIDE[opponent.team]
+        return not self.in_check(side) and not self.has_legal_move(side)
 
     def legal_move(self, fr, to, player, feedback=False):
         """Validate a move."""
         team = player.team
 
         # Off-bounds check
-        if fr.lower() not in BOARD_POSIT or to.lower() not in BOARD_POSIT:
+        if fr is None or to is None:
             # print("\nYou can't move off the board!")
             return None
 
-        # Extract files, ranks
-        fr_file, fr_rank = fr.lower()
-        to_file, to_rank = to.lower()
-
         # Basic error checks
         if fr == to:
             if feedback:
                 print("\nYou can't move to the same space!")
             return False
-        if self.get(fr) is None:
+        if self.squares[fr] == EMPTY:
             if feedback:
                 print("\nYou can't move from an empty space!")
             return False
-        if self.get(fr).team != team:
+        if self.squares[fr] & BLACK != SIDE[team]:
             if feedback:
                 print("\nYou can't move the other player's pieces!")
             return False
 
-        # Compute distances
-        file_dist = ord(to_file) - ord(fr_file)
-        rank_dist = int(to_rank) - int(fr_rank)
-
-        # Compute absolute action
-        action = abs(file_dist), abs(rank_dist)
+        # Reachable by this piece?
+        if not any(move & 4095 == encode_move(fr, to) for move in self.piece_moves(fr)):
+            if feedback:
+                self._explain_move(fr, to)
+            return False
 
-        # Get pieces
-        piece = self.get(fr)
-        other = self.get(to)
-
-        # Error check pawn
-        if piece.name == 'Pawn':
-            if player.near:
-                if to_rank > fr_rank:
-                    if feedback:
-                        print("\nYou can't move a Pawn backwards!")
-                    return False
+        # Safe for the King?
+        if not any(move & 4095 == encode_move(fr, to) for move in self.legal_moves(SIDE[team]) if move & 63 == fr):
+            if feedback:
+                print("\nYou can't leave your King in check!")
+            return False
+        return True
+
+    def _explain_move(self, fr, to):
+        """Report why a move is not reachable."""
+        piece = self.occupants[fr]
+        other = self.squares[to]
+        file_dist = (to & 7) - (fr & 7)
+        rank_dist = (to >> 3) - (fr >> 3)
+        if other != EMPTY and other & BLACK == piece.code & BLACK:
+            print(f"\nYou can't attack your own pieces!")
+        elif piece.name == 'Pawn':
+            forward = rank_dist if piece.code & BLACK == WHITE else -rank_dist
+            if forward < 0:
+                print("\nYou can't move a Pawn backwards!")
+            elif file_dist == 0 and forward in (1, 2) and other != EMPTY:
+                print("\nYou can't attack forwards with a Pawn!")
+            elif abs(file_dist) == 1 and forward == 1 and other == EMPTY:
+                print("\nYou can't attack an empty space!")
+            elif file_dist == 0 and forward == 2:
+                print("\nYou can't do that anymore!")
             else:
-                if to_rank < fr_rank:
-                    if feedback:
-                        print("\nYou can't move a Pawn backwards!")
-                    return False
-            if action == (0, 1) and other is not None:
-                if feedback:
-                    print("\nYou can't attack forwards with a Pawn!")
-                return False
-            if action == (0, 2) and piece.status == True:
-                if feedback:
-                    print("\nYou can't do that anymore!")
-                return False
-            if action == (1, 1) and other is None:
-                if feedback:
-                    print("\nYou can't attack an empty space!")
-                return False
-            if piece.status == False:
-                piece.status = True
+                print(f"\nYou can't do that with a {piece.name}!")
         else:
-            # Initialize pathway.
-            pathway = None
-            # Match by piece.
-            match piece.name:
-                # Determine vertical/horizontal pathway.
-                case 'Rook':
-                    if file_dist == 0:
-                        rank_path = list(range(
-                            min(int(fr_rank), int(to_rank)) + 1,
-                            max(int(fr_rank), int(to_rank))
-                        ))
-                        if len(rank_path) > 0:
-                            pathway = zip_longest(fr_file, rank_path, fillvalue=fr_file)
-                    elif rank_dist == 0:
-                        file_path = list(chr(file) for file in range(
-                            min(ord(fr_file), ord(to_file)) + 1,
-                            max(ord(fr_file), ord(to_file))
-                        ))
-                        if len(file_path) > 0:
-                            pathway = zip_longest(file_path, fr_rank, fillvalue=fr_rank)
-
-                # Determine diagonal pathway.
-                case 'Bishop':
-                    if abs(file_dist) == abs(rank_dist):
-                        if int(fr_rank) < int(to_rank):
-                            rank_path = list(range(
-                                min(int(fr_rank), int(to_rank)) + 1,
-                                max(int(fr_rank), int(to_rank))
-                            ))
-                        else:
-                            rank_path = list(range(
-                                max(int(fr_rank), int(to_rank)) - 1,
-                                min(int(fr_rank), int(to_rank)), -1
-                            ))
-                        if ord(fr_file) < ord(to_file):
-                            file_path = list(chr(file) for file in range(
-                                min(ord(fr_file), ord(to_file)) + 1,
-                                max(ord(fr_file), ord(to_file))
-                            ))
-                        else:
-                            file_path = list(chr(file) for file in range(
-                                max(ord(fr_file), ord(to_file)) - 1,
-                                min(ord(fr_file), ord(to_file)), -1
-                            ))
-                        if len(rank_path) > 0 and len(file_path) > 0:
-                            pathway = zip(file_path, rank_path)
-
-                # Determine any pathway.
-                case 'Queen':
-                    if file_dist == 0:
-                        rank_path = list(range(
-                            min(int(fr_rank), int(to_rank)) + 1,
-                            max(int(fr_rank), int(to_rank))
-                        ))
-                        if len(rank_path) > 0:
-                            pathway = zip_longest(fr_file, rank_path, fillvalue=fr_file)
-                    elif rank_dist == 0:
-                        file_path = list(chr(file) for file in range(
-                            min(ord(fr_file), ord(to_file)) + 1,
-                            max(ord(fr_file), ord(to_file))
-                        ))
-                        if len(file_path) > 0:
-                            pathway = zip_longest(file_path, fr_rank, fillvalue=fr_rank)
-                    elif abs(file_dist) == abs(rank_dist):
-                        if int(fr_rank) < int(to_rank):
-                            rank_path = list(range(
-                                min(int(fr_rank), int(to_rank)) + 1,
-                                max(int(fr_rank), int(to_rank))
-                            ))
-                        else:
-                            rank_path = list(range(
-                                max(int(fr_rank), int(to_rank)) - 1,
-                                min(int(fr_rank), int(to_rank)), -1
-                            ))
-                        if ord(fr_file) < ord(to_file):
-                            file_path = list(chr(file) for file in range(
-                                min(ord(fr_file), ord(to_file)) + 1,
-                                max(ord(fr_file), ord(to_file))
-                            ))
-                        else:
-                            file_path = list(chr(file) for file in range(
-                                max(ord(fr_file), ord(to_file)) - 1,
-                                min(ord(fr_file), ord(to_file)), -1
-                            ))
-                        if len(rank_path) > 0 and len(file_path) > 0:
-                            pathway = zip(file_path, rank_path)
-
-                # Determine if this puts me in check(mate), or not.
-                # If it does, it's an invalid move.
-                case 'King':
-                    ...
-
-            # Check for an obstacle in pathway.
-            if pathway is not None:
-                for file, rank in pathway:
-                    pos = file + str(rank)
-                    block = self.get(pos)
-                    if block is not None:
-                        if feedback:
-                            print(f"\nThere is a {block.name} in the way!")
-                        return None
-                # No obstacle, this action is valid.
-                piece.actions.add(action)
-
-        # Check for captured piece, or not, or invalid action.
-        if action in piece.actions:
-            if other is not None:
-                if other.team != piece.team:
-                    return True
-                else:
-                    if feedback:
-                        print(f"\nYou can't attack your own pieces!")
-                    return False
+            pathway = ChessBoard._pathway(fr, to, piece.name)
+            for pos in pathway or ():
+                if self.squares[pos] != EMPTY:
+                    print(f"\nThere is a {self.occupants[pos].name} in the way!")
+                    return
+            print(f"\nYou can't do that with a {piece.name}!")
+
+    # MOVE GENERATION
+    def generate_moves(self, side):
+        """Generate the pseudo-legal moves for a side."""
+        moves = []
+        for fr, code in enumerate(self.squares):
+            if code != EMPTY and code & BLACK == side:
+                moves += self.piece_moves(fr)
+        return moves
+
+    def legal_moves(self, side, first=False, captures=False):
+        """Generate the moves that do not leave a side's King attacked, from the checkers and pins of its King.
+
+        With first, stop as soon as one is found; with captures, generate only
+        captures, en passant and promotions to a Queen.
+        """
+        squares = self.squares
+        if KING | side not in squares:  # Nothing to keep safe
+            return self.generate_captures(side) if captures else self.generate_moves(side)
+        king = squares.index(KING | side)
+        enemy = side ^ BLACK
+        checkers = self.attackers(king, enemy)
+        moves = []
+        if len(checkers) < 2:  # Only the King can answer a double check
+            targets = None
+            if checkers:  # Capture the checker or block its line
+                checker = checkers[0]
+                targets = {checker}
+                if squares[checker] & KIND_MASK in RAYS:
+                    ray = next(ray for ray in QUEEN_RAYS[king] if checker in ray)
+                    targets.update(ray[:ray.index(checker)])
+            pins = self.pins(king, side)
+            ep = self.ep
+            if captures:
+                by_piece = {}
+                for move in self.generate_captures(side):
+                    by_piece.setdefault(move & 63, []).append(move)
+                by_piece.pop(king, None)
+                pieces = by_piece.items()
             else:
-                return True
+                pieces = (
+                    (fr, self.piece_moves(fr)) for fr, code in enumerate(squares)
+                    if code != EMPTY and code & BLACK == side and fr != king
+                )
+            for fr, pseudo in pieces:
+                code = squares[fr]
+                pin = pins.get(fr)
+                if pin is None and targets is None and (ep is None or code & KIND_MASK != PAWN):
+                    moves += pseudo  # Free to move anywhere it can reach
+                else:
+                    for move in pseudo:
+                        to = move >> 6 & 63
+                        if to == ep and code & KIND_MASK == PAWN:
+                            # En passant empties two squares of a rank at once: rare enough to play out
+                            self.make_move(move)
+                            if not self.in_check(side):
+                                moves.append(move)
+                            self.unmake_move()
+                        elif (pin is None or to in pin) and (targets is None or to in targets):
+                            moves.append(move)
+                if first and moves:
+                    return moves
+        if captures:  # Castling never captures
+            king_moves = [king | to << 6 for to in KING_ATTACKS[king] if squares[to] != EMPTY and squares[to] & BLACK != side]
         else:
-            if feedback:
-                print(f"\nYou can't do that with a {piece.name}!")
-            return False
+            king_moves = self.piece_moves(king)
+        attacks, enemy = self.attacks, enemy << 3
+        behind = set()  # Squares a checking slider reaches through the King once it steps aside
+        for checker in checkers:
+            if squares[checker] & KIND_MASK in RAYS:
+                ray = next(ray for ray in QUEEN_RAYS[checker] if king in ray)
+                behind.update(ray[ray.index(king) + 1:ray.index(king) + 2])
+        moves += [move for move in king_moves if not attacks[enemy | move >> 6 & 63] and move >> 6 & 63 not in behind]
+        return moves
+
+    def has_legal_move(self, side):
+        """Determine if a side has any legal move."""
+        return bool(self.legal_moves(side, first=True))
+
+    def generate_captures(self, side):
+        """Generate the pseudo-legal captures for a side, with en passant and promotions to a Queen.
+
+        Captures are found from their victims, so only the enemy pieces the side attacks are looked at.
+        """
+        squares, attacks = self.squares, self.attacks
+        base, enemy = side << 3, side ^ BLACK
+        moves = []
+        for to, code in enumerate(squares):
+            if code != EMPTY and code & BLACK == enemy and attacks[base | to]:
+                for fr in self.attackers(to, side):
+                    if squares[fr] & KIND_MASK == PAWN and to >> 3 in (0, 7):
+                        moves += [fr | to << 6 | promotion << 12 for promotion in PROMOTIONS]
+                    else:
+                        moves.append(fr | to << 6)
+        pawn = PAWN | side
+        forward = 8 if side == WHITE else -8
+        seventh = 6 if side == WHITE else 1  # Rank the side's pawns promote from
+        for fr in range(seventh * BOARD_WIDTH, (seventh + 1) * BOARD_WIDTH):
+            if squares[fr] == pawn and squares[fr + forward] == EMPTY:
+                moves.append(fr | (fr + forward) << 6 | QUEEN << 12)
+        if self.ep is not None:
+            moves += [fr | self.ep << 6 for fr in PAWN_ATTACKS[enemy][self.ep] if squares[fr] == pawn]
+        return moves
+
+    def piece_moves(self, fr):
+        """Generate the pseudo-legal moves of the piece on a square."""
+        squares = self.squares
+        code = squares[fr]
+        side = code & BLACK
+        kind = code & KIND_MASK
+        moves = []
+        if kind == PAWN:
+            targets = []
+            for to in PAWN_ATTACKS[side][fr]:
+                other = squares[to]
+                if other != EMPTY and other & BLACK != side or to == self.ep:
+                    targets.append(to)
+            forward = 8 if side == WHITE else -8
+            to = fr + forward
+            if squares[to] == EMPTY:  # Pawns never stand on their last rank, so this stays on the board
+                targets.append(to)
+                home = 1 if side == WHITE else 6
+                if fr >> 3 == home and squares[to + forward] == EMPTY:
+                    targets.append(to + forward)
+            for to in targets:
+                if to >> 3 in (0, 7):
+                    moves += [fr | to << 6 | promotion << 12 for promotion in PROMOTIONS]
+                else:
+                    moves.append(fr | to << 6)
+        elif kind in STEPS:
+            for to in STEPS[kind][fr]:
+                other = squares[to]
+                if other == EMPTY or other & BLACK != side:
+                    moves.append(fr | to << 6)
+            if kind == KING and self.castling:
+                moves += self.castling_moves(side)
+        else:
+            for ray in RAYS[kind][fr]:
+                for to in ray:
+                    other = squares[to]
+                    if other != EMPTY:
+                        if other & BLACK != side:
+                            moves.append(fr | to << 6)
+                        break
+                    moves.append(fr | to << 6)
+        return moves
+
+    def castling_moves(self, side):
+        """Generate the castles a side holds the right to, with the King not in, through or into check."""
+        squares = self.squares
+        moves = []
+        for right, king_fr, king_to, rook_fr, rook_to in CASTLES[side]:
+            if not self.castling & right or squares[king_fr] != KING | side or squares[rook_fr] != ROOK | side:
+                continue
+            if any(squares[sq] != EMPTY for sq in range(min(king_fr, rook_fr) + 1, max(king_fr, rook_fr))):
+                continue
+            if not any(self.is_square_attacked(sq, side ^ BLACK) for sq in (king_fr, rook_to, king_to)):
+                moves.append(king_fr | king_to << 6)
+        return moves
+
+    # MAKE / UNMAKE
+    def make_move(self, move):
+        """Play a move in place, recording how to undo it; return the piece captured."""
+        squares = self.squares
+        fr, to, promotion = move & 63, move >> 6 & 63, move >> 12
+        piece, captured = squares[fr], squares[to]
+        ep = self.ep
+        self.history.append(
+            (move, piece, captured, self.key, self.score, self.castling, ep, self.halfmove, self.attacks, self.pawn_key)
+        )
+        kind = piece & KIND_MASK
+        changed = [fr, to]
+        if kind == PAWN and to == ep:
+            changed.append(to ^ 8)
+        elif kind == KING and to - fr in (2, -2):
+            changed += CASTLING_ROOKS[to]
+        # Only the pieces on the changed squares, and the sliders' lines through them, attack anew
+        attacks = self.attacks[:]
+        lines = self.lines_through(changed)
+        for square in changed:
+            if squares[square] != EMPTY:
+                base, bit = (squares[square] & BLACK) << 3, 1 << square
+                for target in piece_attacks(squares, square):
+                    attacks[base | target] ^= bit
+        for base, bit, ray in lines:
+            for target in ray:
+                attacks[base | target] ^= bit
+                if squares[target] != EMPTY:
+                    break
+        placed = promotion | piece & BLACK if promotion else piece
+        squares[to] = placed
+        squares[fr] = EMPTY
+        key = self.key ^ ZOBRIST_SIDE ^ ZOBRIST_CASTLING[self.castling]
+        key ^= ZOBRIST_PIECES[piece][fr] ^ ZOBRIST_PIECES[placed][to] ^ ZOBRIST_PIECES[captured][to]
+        score = self.score + VALUES[placed][to] - VALUES[piece][fr] - VALUES[captured][to]
+        pawn_key = self.pawn_key
+        if kind == PAWN:
+            pawn_key ^= ZOBRIST_PIECES[piece][fr] ^ (0 if promotion else ZOBRIST_PIECES[piece][to])
+        if captured & KIND_MASK == PAWN:
+            pawn_key ^= ZOBRIST_PIECES[captured][to]
+        self.halfmove = 0 if captured != EMPTY else self.halfmove + 1
+        self.ep = None
+        if kind == PAWN:
+            self.halfmove = 0
+            if to == ep:  # En passant: the captured pawn stands behind the square moved to
+                behind = to ^ 8
+                captured = squares[behind]
+                squares[behind] = EMPTY
+                key ^= ZOBRIST_PIECES[captured][behind]
+                pawn_key ^= ZOBRIST_PIECES[captured][behind]
+                score -= VALUES[captured][behind]
+            elif to - fr in (16, -16):
+                self.ep = (fr + to) // 2
+        elif kind == KING and to - fr in (2, -2):  # Castling: bring the Rook across
+            rook_fr, rook_to = CASTLING_ROOKS[to]
+            rook = squares[rook_fr]
+            squares[rook_to], squares[rook_fr] = rook, EMPTY
+            key ^= ZOBRIST_PIECES[rook][rook_fr] ^ ZOBRIST_PIECES[rook][rook_to]
+            score += VALUES[rook][rook_to] - VALUES[rook][rook_fr]
+        if ep is not None:
+            key ^= ZOBRIST_EP[ep & 7]
+        if self.ep is not None:
+            key ^= ZOBRIST_EP[self.ep & 7]
+        for square in changed:
+            if squares[square] != EMPTY:
+                base, bit = (squares[square] & BLACK) << 3, 1 << square
+                for target in piece_attacks(squares, square):
+                    attacks[base | target] ^= bit
+        for base, bit, ray in lines:
+            for target in ray:
+                attacks[base | target] ^= bit
+                if squares[target] != EMPTY:
+                    break
+        self.attacks = attacks
+        self.castling &= CASTLING_KEPT[fr] & CASTLING_KEPT[to]
+        self.key = key ^ ZOBRIST_CASTLING[self.castling]
+        self.pawn_key = pawn_key
+        self.score = score
+        if self.side == BLACK:
+            self.fullmove += 1
+        self.side ^= BLACK
+        return captured
+
+    def unmake_move(self):
+        """Take back the last move played with make_move."""
+        (move, piece, captured, self.key, self.score, self.castling, self.ep, self.halfmove, self.attacks,
+         self.pawn_key) = self.history.pop()
+        self.side ^= BLACK
+        if self.side == BLACK:
+            self.fullmove -= 1
+        if move:  # Null moves leave the squares alone
+            squares = self.squares
+            fr, to = move & 63, move >> 6 & 63
+            squares[fr] = piece
+            squares[to] = captured
+            kind = piece & KIND_MASK
+            if kind == PAWN and to == self.ep:
+                squares[to ^ 8] = PAWN | self.side ^ BLACK
+            elif kind == KING and to - fr in (2, -2):
+                rook_fr, rook_to = CASTLING_ROOKS[to]
+                squares[rook_fr], squares[rook_to] = squares[rook_to], EMPTY
+
+    def make_null_move(self):
+        """Pass the turn in place; taken back with unmake_move."""
+        self.history.append(
+            (0, EMPTY, EMPTY, self.key, self.score, self.castling, self.ep, self.halfmove, self.attacks, self.pawn_key)
+        )
+        self.key ^= ZOBRIST_SIDE
+        if self.ep is not None:
+            self.key ^= ZOBRIST_EP[self.ep & 7]
+            self.ep = None
+        if self.side == BLACK:
+            self.fullmove += 1
+        self.side ^= BLACK
+
+    def lines_through(self, changed):
+        """List the lines, as (side << 3, bit, ray), of the sliders off the changed squares that reach any of them."""
+        squares, attacks = self.squares, self.attacks
+        found = []
+        for square in changed:
+            for fr in bit_squares(attacks[square] | attacks[BLACK << 3 | square]):
+                code = squares[fr]
+                if code & KIND_MASK in RAYS and fr not in changed:
+                    line = ((code & BLACK) << 3, 1 << fr, LINES[fr][square])
+                    if line not in found:
+                        found.append(line)
+        return found
+
+    def snapshot(self):
+        """Return the position in a compact, picklable form."""
+        return bytes(self.squares), self.side, self.castling, self.ep, self.halfmove, self.fullmove
+
+    def restore(self, snapshot):
+        """Set the position from a snapshot, dropping the piece objects and undo stack."""
+        squares, self.side, self.castling, self.ep, self.halfmove, self.fullmove = snapshot
+        self.squares = list(squares)
+        self.occupants = [None] * BOARD_SIZE
+        self.history = []
+        self.key = self.compute_key()
+        self.pawn_key = self.compute_pawn_key()
+        self.score = self.compute_score()
+        self.attacks = self.compute_attacks()
+
+    def compute_key(self):
+        """Compute the Zobrist key of the position from scratch."""
+        key = ZOBRIST_SIDE if self.side == BLACK else 0
+        key ^= ZOBRIST_CASTLING[self.castling]
+        if self.ep is not None:
+            key ^= ZOBRIST_EP[self.ep & 7]
+        for square, code in enumerate(self.squares):
+            key ^= ZOBRIST_PIECES[code][square]
+        return key
+
+    def compute_pawn_key(self):
+        """Compute the Zobrist key of the pawns alone from scratch."""
+        key = 0
+        for square, code in enumerate(self.squares):
+            if code & KIND_MASK == PAWN:
+                key ^= ZOBRIST_PIECES[code][square]
+        return key
+
+    def compute_score(self):
+        """Compute the material and placement score from scratch."""
+        return sum(VALUES[code][square] for square, code in enumerate(self.squares))
+
+    def compute_attacks(self):
+        """Compute the attackers of each square from scratch."""
+        squares = self.squares
+        attacks = [0] * 2 * BOARD_SIZE
+        for fr, code in enumerate(squares):
+            if code != EMPTY:
+                for to in piece_attacks(squares, fr):
+                    attacks[(code & BLACK) << 3 | to] |= 1 << fr
+        return attacks
 
     # MOVEMENT / TAKING
-    def move(self, fr, to, feedback=False):
-        """Move a chesspiece from one position to another."""
+    def move(self, fr, to, feedback=False, promotion=QUEEN):
+        """Move a chesspiece from one position to another; a Pawn reaching its last rank becomes the promotion."""
         piece = self.get(fr)
-        captured = self.get(to)
+        kind = self.squares[fr] & KIND_MASK
+        taken = to ^ 8 if kind == PAWN and to == self.ep else to  # En passant takes the pawn behind
+        captured = self.get(taken)
+        if kind != PAWN or to >> 3 not in (0, 7):
+            promotion = EMPTY
+        self.make_move(encode_move(fr, to, promotion))
+        self.occupants[taken] = None
+        self.occupants[fr] = None
+        if promotion:
+            piece = PIECE_CLASSES[promotion](piece.team)
+        self.occupants[to] = piece
+        piece.pos = to
+        if kind == KING and to - fr in (2, -2):
+            rook_fr, rook_to = CASTLING_ROOKS[to]
+            rook = self.occupants[rook_fr]
+            self.occupants[rook_fr], self.occupants[rook_to] = None, rook
+            rook.pos = rook_to
+        if feedback:
+            print(f"\n{piece}: {SQUARE_NAMES[fr]} -> {SQUARE_NAMES[to]}")
         if captured is not None:
-            self.set(piece, to)
-            piece.pos = to
-            self.set(None, fr)
             if feedback:
-                print(f"\n{piece}: {fr} -> {to}")
                 print(f"\nCaptured a {captured.name}.")
             return captured
-        else:
-            self.set(piece, to)
-            piece.pos = to
-            self.set(None, fr)
-            if feedback:
-                print(f"\n{piece}: {fr} -> {to}")
-            return False
+        return False
 
     def set(self, piece, pos):
         """Set a piece on the board."""
-        file, rank = pos
-        self.matrix[int(rank) - 1][ChessBoard._file_to_index(file)] = piece
+        if piece is None:
+            self.squares[pos] = EMPTY
+        else:
+            self.squares[pos] = piece.code
+            piece.pos = pos
+        self.occupants[pos] = piece
 
     def setup(self, pieces_p1, pieces_p2):
         """Setup the board."""
-        # P1 setup
-        for pawn, pos in zip(pieces_p1["Pawn"], BOARD_RANKS[7 - 1]):
-            pawn.pos = pos
-            self.set(pawn, pos)
-        for rook, pos in zip(pieces_p1["Rook"], ('a8', 'h8')):
-            rook.pos = pos
-            self.set(rook, pos)
-        for knight, pos in zip(pieces_p1["Knight"], ('b8', 'g8')):
-            knight.pos = pos
-            self.set(knight, pos)
-        for bishop, pos in zip(pieces_p1["Bishop"], ('c8', 'f8')):
-            bishop.pos = pos
-            self.set(bishop, pos)
-        pieces_p1["Queen"][0].pos = 'd8'; self.set(pieces_p1["Queen"][0], 'd8')
-        pieces_p1["King"][0].pos = 'e8'; self.set(pieces_p1["King"][0], 'e8')
-
-        # P2 setup
-        for pawn, pos in zip(pieces_p2["Pawn"], BOARD_RANKS[2 - 1]):
-            pawn.pos = pos
-            self.set(pawn, pos)
-        for rook, pos in zip(pieces_p2["Rook"], ('a1', 'h1')):
-            rook.pos = pos
-            self.set(rook, pos)
-        for knight, pos in zip(pieces_p2["Knight"], ('b1', 'g1')):
-            knight.pos = pos
-            self.set(knight, pos)
-        for bishop, pos in zip(pieces_p2["Bishop"], ('c1', 'f1')):
-            bishop.pos = pos
-            self.set(bishop, pos)
-        pieces_p2["Queen"][0].pos = 'd1'; self.set(pieces_p2["Queen"][0], 'd1')
-        pieces_p2["King"][0].pos = 'e1'; self.set(pieces_p2["King"][0], 'e1')
+        self.side = WHITE
+        self.castling = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        self.ep = None
+        self.halfmove, self.fullmove = 0, 1
+        self.history.clear()
+        for pieces in (pieces_p1, pieces_p2):
+            # White sets up on ranks 1 and 2, Black on ranks 8 and 7
+            back_rank = 0 if pieces.team == TEAM_WHITE else BOARD_SIZE - BOARD_WIDTH
+            pawn_rank = 8 if back_rank == 0 else back_rank - BOARD_WIDTH
+            for file, pawn in enumerate(pieces[PAWN]):
+                self.set(pawn, pawn_rank + file)
+            for rook, file in zip(pieces[ROOK], (0, 7)):
+                self.set(rook, back_rank + file)
+            for knight, file in zip(pieces[KNIGHT], (1, 6)):
+                self.set(knight, back_rank + file)
+            for bishop, file in zip(pieces[BISHOP], (2, 5)):
+                self.set(bishop, back_rank + file)
+            self.set(pieces[QUEEN][0], back_rank + 3)
+            self.set(pieces[KING][0], back_rank + 4)
+        self.key = self.compute_key()
+        self.pawn_key = self.compute_pawn_key()
+        self.score = self.compute_score()
+        self.attacks = self.compute_attacks()
+
+    # FEN
+    def load_fen(self, fen):
+        """Set the position from FEN; return the new PieceSets of White and Black.
+
+        The FEN is checked in full before the board changes, so a bad one leaves the position as it was.
+        """
+        fields = fen.split()
+        if len(fields) not in (4, 6):
+            raise ValueError(f"FEN needs 4 or 6 fields: {fen!r}")
+        placement, side, castling, ep = fields[:4]
+        rows = placement.split('/')
+        if len(rows) != BOARD_WIDTH or side not in ('w', 'b') or ep != '-' and ep not in SQUARES:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        if castling != '-' and (not castling or any(letter not in CASTLING_LETTERS for letter in castling)):
+            raise ValueError(f"Invalid FEN castling rights: {castling!r}")
+        try:
+            clocks = (int(fields[4]), int(fields[5])) if len(fields) == 6 else (0, 1)
+        except ValueError:
+            raise ValueError(f"Invalid FEN move counters: {fen!r}") from None
+        sets = {team: PieceSet(team) for team in (TEAM_WHITE, TEAM_BLACK)}
+        squares = [EMPTY] * BOARD_SIZE
+        occupants = [None] * BOARD_SIZE
+        for rank, row in zip(reversed(range(BOARD_WIDTH)), rows):
+            file = 0
+            for letter in row:
+                if letter.isdigit():
+                    file += int(letter)
+                    continue
+                kind = next((kind for kind, symbol in PIECE_LETTERS.items() if symbol == letter.upper()), None)
+                if kind is None or file >= BOARD_WIDTH or kind == PAWN and rank in (0, BOARD_WIDTH - 1):
+                    raise ValueError(f"Invalid FEN rank {row!r}")
+                team = TEAM_WHITE if letter.isupper() else TEAM_BLACK
+                piece = PIECE_CLASSES[kind](team)
+                sets[team].add(piece)
+                piece.pos = rank * BOARD_WIDTH + file
+                squares[piece.pos], occupants[piece.pos] = piece.code, piece
+                file += 1
+            if file != BOARD_WIDTH:
+                raise ValueError(f"Invalid FEN rank {row!r}")
+        self.squares, self.occupants = squares, occupants
+        self.side = WHITE if side == 'w' else BLACK
+        self.castling = sum(1 << CASTLING_LETTERS.index(letter) for letter in set(castling.replace('-', '')))
+        self.ep = None if ep == '-' else SQUARES[ep]
+        self.halfmove, self.fullmove = clocks
+        self.history = []
+        self.key = self.compute_key()
+        self.pawn_key = self.compute_pawn_key()
+        self.score = self.compute_score()
+        self.attacks = self.compute_attacks()
+        return sets[TEAM_WHITE], sets[TEAM_BLACK]
+
+    def to_fen(self):
+        """Return the position as FEN."""
+        rows = []
+        for rank in reversed(range(BOARD_WIDTH)):
+            row, empty = '', 0
+            for code in self.squares[rank * BOARD_WIDTH:(rank + 1) * BOARD_WIDTH]:
+                if code == EMPTY:
+                    empty += 1
+                    continue
+                letter = PIECE_LETTERS[code & KIND_MASK]
+                row += (str(empty) if empty else '') + (letter if code & BLACK == WHITE else letter.lower())
+                empty = 0
+            rows.append(row + (str(empty) if empty else ''))
+        castling = ''.join(letter for bit, letter in enumerate(CASTLING_LETTERS) if self.castling >> bit & 1) or '-'
+        ep = SQUARE_NAMES[self.ep] if self.ep is not None else '-'
+        return f"{'/'.join(rows)} {'w' if self.side == WHITE else 'b'} {castling} {ep} {self.halfmove} {self.fullmove}"
@@ -1,46 +1,696 @@
 """Defines the computer (AI) interface."""
 
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+from threading import Thread
+from multiprocessing import get_context
+from itertools import count
 from math import inf
+from time import monotonic
+from .book import OpeningBook
+from .chessboard import WEIGHT_SCALE, WEIGHTS, ChessBoard, move_name
+from .constants import BISHOP, EMPTY, KIND_MASK, KNIGHT, QUEEN, ROOK, TEAM_BLACK, TEAM_WHITE
+from .game import Game
+from .pieces import Pawn, Queen, new_set
 from .player import Player
+from .stats import SearchStats
+from .tablebase import Tablebase
+from .transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget runs out."""
 
 class Computer(Player):
     """The computer (AI)."""
 
-    def __init__(self, team, pieces, near=False):
+    MAX_PLY = 64  # Deepest iteration when no depth limit is set
+    MOVES_TO_GO = 30  # Moves the remaining clock time is spread over
+    CHECK_EVERY = 1024  # Nodes between clock checks
+    NULL_MOVE_REDUCTION = 2  # Plies saved by searching a passed turn
+    NULL_MOVE_DEPTH = 3  # Fewest plies left for a null move
+    LMR_MOVES = 3  # Moves searched in full before reducing
+    LMR_DEPTH = 3  # Fewest plies left for a reduction
+    ASPIRATION_WINDOW = Pawn.WEIGHT * WEIGHT_SCALE // 2  # Half-width of the first root window around the last score
+    DELTA_MARGIN = 2 * Pawn.WEIGHT * WEIGHT_SCALE  # Slack before a capture is judged unable to matter
+    TABLEBASE_WIN = 100 * Queen.WEIGHT * WEIGHT_SCALE  # Score of a tablebase win, less its distance to mate
+
+    def __init__(self, team, pieces, near=False, hash_size=16, move_time=2.0, max_depth=None, verbose=False, log=None,
+                 workers=1, book=None, tablebases=None, ponder=False, max_nodes=None):
         super().__init__(team, pieces, near),
+        self.hash_size = hash_size
+        self.table = TranspositionTable(hash_size)  # Transposition table, sized in MB
+        self.move_time = move_time  # Seconds per move, or None to search to max_depth
+        self.max_depth = max_depth  # Deepest iteration in plies, or None for no limit
+        self.max_nodes = max_nodes  # Most nodes per move, or None for no limit
+        self.node_limit = inf
+        self.clock = None  # Seconds left on the game clock, if one is running
+        self.increment = 0  # Seconds added to the clock per move
+        self.deadline = inf
+        self.stats = SearchStats()  # Statistics of the last search
+        self.pvs = True  # Search moves after the first with a null window
+        self.aspiration = Computer.ASPIRATION_WINDOW  # Root window half-width, or 0 for a full window
+        self.verbose = verbose  # Print the statistics after each search
+        self.log = log  # File to write the statistics to as JSON lines, if any
+        self.killers = [[None, None] for _ in range(Computer.MAX_PLY + 2)]  # Quiet cutoff moves, per ply
+        self.history = [0] * 8192  # Quiet cutoff scores, indexed by side and move
+        self.workers = workers  # Processes sharing the root moves, or 1 to search here
+        self.pool = None
+        self.pool_args = None  # Arguments the worker processes were started with
+        self.root_depth = 1
+        self.root_moves = None  # Root moves to consider, or None for all
+        self.book = OpeningBook(book) if book else None  # Opening book consulted before searching, if any
+        self.tablebase = Tablebase(tablebases) if tablebases else None  # Endgame tables probed in search, if any
+        self.moves_to_go = None  # Moves left until the clock is topped up, if known
+        self.stopping = False  # Set from another thread to end the search early
+        self.stop_event = None  # Shared with the worker processes to end their searches early
+        self.stop_signal = None  # The owner's stop event, in a worker process
+        self.report = None  # Called with the statistics after each completed iteration, if set
+        self.ponder = ponder  # Search the expected reply while the opponent thinks
+        self.pondering = None  # Key of the position being pondered, while pondering
+        self.ponder_thread = None
+        self.leaf_scores = (None, {})  # Key of the last node before the last ply, and its children's evaluations by move
 
     def __str__(self):
         return super().__str__()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['pool'] = state['stop_event'] = None  # Worker processes stay with their owner
+        state['book'] = None  # Workers only search
+        state['ponder_thread'] = None
+        return state, {name: getattr(self, name) for name in Player.__slots__}
+
+    def close(self):
+        """Shut down the worker processes, if any were started, and release the book."""
+        self.close_pool()
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+
+    def close_pool(self):
+        """Shut down the worker processes, if any were started."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = self.stop_event = None
+
+    def set_hash_size(self, size_mb):
+        """Replace the transposition table with an empty one of a new size."""
+        self.hash_size = size_mb
+        self.table = TranspositionTable(size_mb)
+        self.close_pool()  # Workers size their tables when they start
+
+    def set_clock(self, remaining, increment=0, moves_to_go=None):
+        """Play on a game clock instead of a fixed time per move."""
+        self.clock, self.increment, self.moves_to_go = remaining, increment, moves_to_go
+
+    def time_budget(self):
+        """Return the seconds to spend on the next move, or None for no limit."""
+        if self.pondering is not None:  # Until the opponent moves
+            return None
+        if self.clock is not None:
+            budget = self.clock / (self.moves_to_go or Computer.MOVES_TO_GO) + self.increment
+            return max(0.0, min(budget, self.clock - 0.05))
+        return self.move_time
+
+    def stop(self):
+        """End the search in progress, from another thread; it returns the best move found so far."""
+        self.stopping = True
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def clear_stop(self):
+        """Let the next search run after a stop."""
+        self.stopping = False
+        if self.stop_event is not None:
+            self.stop_event.clear()
+
+    def check_time(self):
+        """Count a node, aborting the search once stopped or past the deadline."""
+        self.stats.nodes += 1
+        if self.stopping:
+            raise SearchTimeout
+        if self.stats.nodes % Computer.CHECK_EVERY == 0:
+            if monotonic() > self.deadline or self.stats.nodes > self.node_limit \
+                    or self.stop_signal is not None and self.stop_signal.is_set():
+                raise SearchTimeout
+
+    def choose_move(self, game, state, depth):
+        """Play from the opening book or the endgame tables when they cover the position, otherwise search.
+
+        Return a legal move whenever there is one, even if the search was stopped before its first iteration.
+        """
+        board = state['board']
+        move, source = self.book.choose(board) if self.book is not None else None, 'book'
+        if move is None and self.tablebase is not None:
+            move, source = self.tablebase.best_move(board), 'tablebase'
+        if move is None:
+            move = self.alpha_beta_search(game, state, depth)
+            if move is None:  # Stopped before the first iteration: any move beats none
+                actions = game.actions(state)
+                move = actions[0] if actions else None
+            return move
+        if self.verbose:
+            print(f"\n{source} {move_name(move)}")
+        return move
+
     # A-B SEARCH
     def alpha_beta_search(self, game, state, depth):
-        _, move = self.max_value(game, state, -inf, inf, depth + 1)
+        """Search one ply deeper each iteration until the time budget or max_depth is reached."""
+        if self.workers > 1:
+            return self.parallel_search(game, state)
+        board = state['board']
+        root = state['root'] = len(board.history)
+        budget = self.time_budget()
+        start = monotonic()
+        limit = self.max_depth or Computer.MAX_PLY
+        best = None
+        self.stats = stats = SearchStats()
+        self.deadline = self.node_limit = inf  # The first iteration always completes
+        self.killers = [[None, None] for _ in range(Computer.MAX_PLY + 2)]
+        self.history = [score // 2 for score in self.history]  # Age the previous search's scores
+        self.leaf_scores = (None, {})  # Scored for whichever team searched last
+        self.root_depth = depth + 1
+        for iteration in count(1):
+            state['max_depth'] = depth + iteration + 1
+            try:
+                score, move = self.aspiration_search(game, state, depth, stats.score)
+            except SearchTimeout:
+                while len(board.history) > root:  # Take back the unfinished line
+                    board.unmake_move()
+                break
+            stats.complete_iteration(iteration, monotonic() - start)
+            if move is not None:
+                best = move
+                stats.score = score
+                stats.results.append((iteration, score, move))
+                stats.pv = self.principal_variation(game, state, move, iteration)
+                if self.report is not None:
+                    self.report(stats)
+            if iteration >= limit:
+                break
+            if self.max_nodes is not None:
+                if stats.nodes >= self.max_nodes:
+                    break
+                self.node_limit = self.max_nodes
+            if budget is not None:
+                elapsed = monotonic() - start
+                if elapsed * 2 > budget:  # The next iteration would not finish
+                    break
+                self.deadline = start + budget
+        stats.elapsed = monotonic() - start
+        self.publish(stats)
+        return best
+
+    # PARALLEL SEARCH
+    def parallel_search(self, game, state):
+        """Split the root moves across worker processes and keep the best result."""
+        start = monotonic()
+        tablebases = self.tablebase.directory if self.tablebase is not None else None
+        game_class = f"{type(game).__module__}:{type(game).__qualname__}"
+        pool_args = (self.hash_size, tablebases, game_class, (self.pvs, self.aspiration))
+        if pool_args != self.pool_args:
+            self.close_pool()  # Workers search as their owner did when they started
+        if self.pool is None:
+            # Spawned, not forked: a fork from the search thread could inherit locks held by other threads
+            context = get_context('spawn')
+            self.stop_event = context.Event()
+            if self.stopping:
+                self.stop_event.set()
+            self.pool = ProcessPoolExecutor(
+                self.workers, mp_context=context, initializer=_init_worker,
+                initargs=(*pool_args, self.stop_event)
+            )
+            self.pool_args = pool_args
+        entry = self.table.probe(state['board'].key)
+        moves = self.order_moves(state, game.actions(state), entry[3] if entry is not None else None, 1)
+        groups = [group for worker in range(self.workers) if (group := moves[worker::self.workers])]  # Dealt round-robin
+        snapshot = state['board'].snapshot()
+        # The workers share the node limit evenly
+        max_nodes = -(-self.max_nodes // len(groups)) if self.max_nodes is not None and groups else None
+        futures = [
+            self.pool.submit(
+                _search_root_moves, snapshot, self.team, group, self.time_budget(), self.max_depth, max_nodes
+            )
+            for group in groups
+        ]
+        self.stats = stats = SearchStats()
+        results = []
+        for future in futures:
+            worker_results, nodes = future.result()
+            stats.nodes += nodes
+            if worker_results:  # A stopped worker may not have finished an iteration
+                results.append(worker_results)
+        if not results:
+            return None
+        # Compare the workers at the deepest iteration they all completed
+        depth = min(worker_results[-1][0] for worker_results in results)
+        best = max(
+            (next(result for result in worker_results if result[0] == depth) for worker_results in results),
+            key=lambda result: result[1]
+        )
+        stats.depth, stats.score, move = best
+        stats.pv = [move_name(move)]
+        stats.elapsed = monotonic() - start
+        if self.report is not None:
+            self.report(stats)
+        self.publish(stats)
         return move
 
+    def publish(self, stats):
+        """Print or log the statistics of a finished search, unless it was only pondering."""
+        if self.pondering is not None:
+            return
+        if self.verbose:
+            print(f"\n{stats}")
+        if self.log is not None:
+            print(stats.to_json(), file=self.log, flush=True)
+
+    # PONDERING
+    def start_pondering(self, game, state):
+        """Search the expected reply on a copy of the board in a background thread, during the opponent's turn."""
+        board = state['board']
+        entry = self.table.probe(board.key)
+        guess = entry[3] if entry is not None else None
+        if guess is None or guess not in board.legal_moves(board.side):
+            return
+        ponder_board = ChessBoard()
+        ponder_board.restore(board.snapshot())
+        ponder_board.make_move(guess)
+        ponder_state = {'board': ponder_board, 'player': state['player'], 'opponent': state['opponent']}
+        self.pondering = ponder_board.key
+        self.clear_stop()
+        self.ponder_thread = Thread(target=self.alpha_beta_search, args=(game, ponder_state, 0), daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self, board):
+        """End the background search; return whether it pondered the position now on the board.
+
+        On a hit the search that follows starts from the pondered transposition
+        table; on a miss the pondered results are simply never asked for.
+        """
+        if self.ponder_thread is None:
+            return False
+        self.stop()
+        self.ponder_thread.join()
+        self.ponder_thread = None
+        self.clear_stop()
+        hit = board.key == self.pondering
+        self.pondering = None
+        if self.verbose:
+            print(f"\nponder {'hit' if hit else 'miss'} after {self.stats}")
+        return hit
+
+    def aspiration_search(self, game, state, depth, previous):
+        """Search the root in a narrow window around the previous score, widening it on failure."""
+        delta = self.aspiration
+        if not delta or previous is None:
+            return self.max_value(game, state, -inf, inf, depth + 1)
+        alpha, beta = previous - delta, previous + delta
+        while True:
+            score, move = self.max_value(game, state, alpha, beta, depth + 1)
+            if score <= alpha:
+                alpha = -inf if alpha - delta < previous - 8 * self.aspiration else alpha - delta
+            elif score >= beta:
+                beta = inf if beta + delta > previous + 8 * self.aspiration else beta + delta
+            else:
+                return score, move
+            self.stats.aspiration_fails += 1
+            delta *= 2
+
+    def principal_variation(self, game, state, move, length):
+        """Follow the stored best moves from the root."""
+        board = state['board']
+        pv = []
+        while move is not None and len(pv) < length and move in game.actions(state):
+            pv.append(move_name(move))
+            board.make_move(move)
+            entry = self.table.probe(board.key)
+            move = entry[3] if entry is not None else None
+        for _ in pv:
+            board.unmake_move()
+        return pv
+
+    # TABLEBASES
+    def tablebase_score(self, state, depth):
+        """Return the exact score of a position for the side to move from the endgame tables, or None."""
+        if self.tablebase is None or depth <= self.root_depth:
+            return None
+        result = self.tablebase.probe(state['board'])
+        if result is None:
+            return None
+        self.stats.tb_hits += 1
+        wdl, dtm = result
+        return wdl * (Computer.TABLEBASE_WIN - dtm)
+
+    # TRANSPOSITIONS
+    def probe(self, state, alpha, beta, depth):
+        """Look up the position, narrowing the window by a stored bound."""
+        self.stats.tt_probes += 1
+        entry = self.table.probe(state['board'].key)
+        if entry is not None:
+            self.stats.tt_hits += 1
+            stored_depth, bound, score, move = entry
+            score = self.from_table(state, score)
+            if stored_depth >= state['max_depth'] - depth and move is not None:
+                if bound == EXACT:
+                    return score, move, alpha, beta
+                if bound == LOWER:
+                    alpha = max(alpha, score)
+                elif bound == UPPER:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score, move, alpha, beta
+            return None, move, alpha, beta
+        return None, None, alpha, beta
+
+    def record(self, state, alpha, beta, depth, value, move):
+        """Store a search result with the bound it proves."""
+        if value in (inf, -inf):
+            return
+        if value <= alpha:
+            bound = UPPER
+        elif value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(state['board'].key, state['max_depth'] - depth, bound, self.to_table(state, value), move)
+
+    def to_table(self, state, score):
+        """Convert a mate score counted from the search's root to one counted from this node, for storing."""
+        if abs(score) > Game.MATE // 2:
+            ply = len(state['board'].history) - state['root']
+            return score + ply if score > 0 else score - ply
+        return score
+
+    def from_table(self, state, score):
+        """Convert a stored mate score counted from its node back to one counted from the search's root."""
+        if abs(score) > Game.MATE // 2:
+            ply = len(state['board'].history) - state['root']
+            return score - ply if score > 0 else score + ply
+        return score
+
+    # MOVE ORDERING
+    def order_moves(self, state, moves, hash_move, depth):
+        """Order moves: hash move, even captures and promotions by MVV-LVA, killers, losing captures, then history."""
+        board = state['board']
+        squares = board.squares
+        killers = self.killers[depth]
+        history = self.history
+        side = board.side << 9  # Selects the side's half of the history table
+
+        def score(move):
+            if move == hash_move:
+                return 1 << 30
+            victim = squares[move >> 6 & 63]
+            if victim != EMPTY or move >> 12:
+                gain = WEIGHTS[victim & KIND_MASK] + WEIGHTS[move >> 12]
+                rank = 1 << 29 if board.exchange(move) >= 0 else 1 << 27  # Losing captures wait for the killers
+                return rank + gain * 64 - WEIGHTS[squares[move & 63] & KIND_MASK]
+            if move in killers:
+                return (1 << 28) - killers.index(move)
+            return history[side | move & 4095]
+
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    def record_cutoff(self, state, move, depth, index):
+        """Count a cutoff and remember the move if it was quiet."""
+        self.stats.cutoffs += 1
+        if index == 0:
+            self.stats.first_cutoffs += 1
+        board = state['board']
+        if board.squares[move >> 6 & 63] != EMPTY or move >> 12:
+            return
+        killers = self.killers[depth]
+        if killers[0] != move:
+            killers[0], killers[1] = move, killers[0]
+        index = board.side << 9 | move & 4095
+        self.history[index] = min(self.history[index] + (state['max_depth'] - depth) ** 2, 1 << 27)
+
+    # SELECTIVITY
+    def null_move_allowed(self, state, beta_side, depth, in_check):
+        """Test whether passing the turn is a safe way to prove a cutoff."""
+        board = state['board']
+        if in_check or beta_side in (inf, -inf) or state['max_depth'] - depth < Computer.NULL_MOVE_DEPTH:
+            return False
+        if board.history and board.history[-1][0] == 0:  # No two passes in a row
+            return False
+        squares = board.squares
+        side = board.side
+        # Zugzwang guard: with only King and Pawns left, passing may be the best move
+        return any(kind | side in squares for kind in (KNIGHT, BISHOP, ROOK, QUEEN))
+
+    def reducible(self, state, action, index, depth, in_check):
+        """Test whether a move is late and quiet enough to search at reduced depth."""
+        return (
+            index >= Computer.LMR_MOVES
+            and state['max_depth'] - depth >= Computer.LMR_DEPTH
+            and not in_check
+            and state['board'].squares[action >> 6 & 63] == EMPTY
+            and not action >> 12
+            and action not in self.killers[depth]
+        )
+
     # MAX-VALUE
     def max_value(self, game, state, alpha, beta, depth):
-        if game.is_cutoff(state, depth) or game.is_terminal(state):
-            return game.evaluate(state), None
-        value = -inf
-        for action in game.actions(state):
-            successor, _ = self.min_value(game, game.result(state, action), alpha, beta, depth + 1)
+        if (score := self.tablebase_score(state, depth)) is not None:
+            self.stats.nodes += 1
+            self.stats.leaves += 1
+            return score, None
+        if game.is_cutoff(state, depth):  # Quiescence searches every evasion in check, so finds checkmate itself
+            return self.quiesce_max(game, state, alpha, beta), None
+        if game.is_terminal(state):  # Checkmate or stalemate
+            self.stats.nodes += 1
+            self.stats.leaves += 1
+            return game.utility(state), None
+        self.check_time()
+        alpha_orig, beta_orig = alpha, beta
+        score, hash_move, alpha, beta = self.probe(state, alpha, beta, depth)
+        if score is not None:
+            return score, hash_move
+        board = state['board']
+        in_check = board.in_check(board.side)
+        if depth > self.root_depth and self.null_move_allowed(state, beta, depth, in_check):
+            # Pass the turn; if the opponent still cannot get below beta, a real move will not either
+            successor, _ = self.min_value(
+                game, game.pass_turn(state), beta - 1, beta, depth + 1 + Computer.NULL_MOVE_REDUCTION
+            )
+            game.undo(state)
+            if successor >= beta:
+                self.stats.null_cutoffs += 1
+                return successor, None
+        actions = game.actions(state)
+        if depth == self.root_depth and self.root_moves is not None:
+            actions = [action for action in actions if action in self.root_moves]
+        actions = self.order_moves(state, actions, hash_move, depth)
+        frontier = game.batched and depth + 1 >= state['max_depth']
+        value, move = -inf, None
+        for index, action in enumerate(actions):
+            if index == 1 and frontier:  # No cutoff on the first move: the rest will likely all be searched
+                self.score_frontier(game, state, actions[1:])
+            reduce = alpha > -inf and self.reducible(state, action, index, depth, in_check)
+            game.result(state, action)
+            reduce = reduce and not board.in_check(board.side)
+            if index > 0 and alpha > -inf and (self.pvs or reduce):
+                # Scout with a null window, one ply shallower if the move is late and quiet
+                successor, _ = self.min_value(game, state, alpha, alpha + 1, depth + 2 if reduce else depth + 1)
+                if successor > alpha and reduce:  # The reduced scout failed high: verify at full depth
+                    self.stats.researches += 1
+                    successor, _ = self.min_value(game, state, alpha, alpha + 1 if self.pvs else beta, depth + 1)
+                if alpha < successor < beta and self.pvs:  # Inside the window: find the exact score
+                    self.stats.researches += 1
+                    successor, _ = self.min_value(game, state, alpha, beta, depth + 1)
+            else:
+                successor, _ = self.min_value(game, state, alpha, beta, depth + 1)
+            game.undo(state)
             if successor > value:
                 value, move = successor, action
                 alpha = max(alpha, value)
             if value >= beta:
-                return value, move
+                self.record_cutoff(state, action, depth, index)
+                break
+        if depth != self.root_depth or self.root_moves is None:  # A share of the root moves does not score the position
+            self.record(state, alpha_orig, beta_orig, depth, value, move)
         return value, move
 
     # MIN-VALUE
     def min_value(self, game, state, alpha, beta, depth):
-        if game.is_cutoff(state, depth) or game.is_terminal(state):
-            return game.evaluate(state), None
-        value = inf
-        for action in game.actions(state):
-            successor, _ = self.max_value(game, game.result(state, action), alpha, beta, depth + 1)
+        if (score := self.tablebase_score(state, depth)) is not None:
+            self.stats.nodes += 1
+            self.stats.leaves += 1
+            return -score, None
+        if game.is_cutoff(state, depth):  # Quiescence searches every evasion in check, so finds checkmate itself
+            return self.quiesce_min(game, state, alpha, beta), None
+        if game.is_terminal(state):  # Checkmate or stalemate
+            self.stats.nodes += 1
+            self.stats.leaves += 1
+            return game.utility(state), None
+        self.check_time()
+        alpha_orig, beta_orig = alpha, beta
+        score, hash_move, alpha, beta = self.probe(state, alpha, beta, depth)
+        if score is not None:
+            return score, hash_move
+        board = state['board']
+        in_check = board.in_check(board.side)
+        if depth > self.root_depth and self.null_move_allowed(state, alpha, depth, in_check):
+            # Pass the turn; if the player still cannot get above alpha, a real move will not either
+            successor, _ = self.max_value(
+                game, game.pass_turn(state), alpha, alpha + 1, depth + 1 + Computer.NULL_MOVE_REDUCTION
+            )
+            game.undo(state)
+            if successor <= alpha:
+                self.stats.null_cutoffs += 1
+                return successor, None
+        actions = self.order_moves(state, game.actions(state), hash_move, depth)
+        frontier = game.batched and depth + 1 >= state['max_depth']
+        value, move = inf, None
+        for index, action in enumerate(actions):
+            if index == 1 and frontier:  # No cutoff on the first move: the rest will likely all be searched
+                self.score_frontier(game, state, actions[1:])
+            reduce = beta < inf and self.reducible(state, action, index, depth, in_check)
+            game.result(state, action)
+            reduce = reduce and not board.in_check(board.side)
+            if index > 0 and beta < inf and (self.pvs or reduce):
+                # Scout with a null window, one ply shallower if the move is late and quiet
+                successor, _ = self.max_value(game, state, beta - 1, beta, depth + 2 if reduce else depth + 1)
+                if successor < beta and reduce:  # The reduced scout failed low: verify at full depth
+                    self.stats.researches += 1
+                    successor, _ = self.max_value(game, state, beta - 1 if self.pvs else alpha, beta, depth + 1)
+                if alpha < successor < beta and self.pvs:  # Inside the window: find the exact score
+                    self.stats.researches += 1
+                    successor, _ = self.max_value(game, state, alpha, beta, depth + 1)
+            else:
+                successor, _ = self.max_value(game, state, alpha, beta, depth + 1)
+            game.undo(state)
             if successor < value:
                 value, move = successor, action
-                beta = min(alpha, value)
+                beta = min(beta, value)
             if value <= alpha:
-                return value, move
+                self.record_cutoff(state, action, depth, index)
+                break
+        self.record(state, alpha_orig, beta_orig, depth, value, move)
         return value, move
+
+    # BATCHED EVALUATION
+    def score_frontier(self, game, state, actions):
+        """Evaluate the children of a node at the last ply together, for quiescence to stand pat on."""
+        scores = game.evaluate_batch(state, game.encode_children(state, actions))
+        self.leaf_scores = state['board'].key, dict(zip(actions, scores))
+
+    def stand_pat(self, game, state):
+        """Return the evaluation of a quiescence node, scored in a batch if it was one of them."""
+        history = state['board'].history
+        parent, scores = self.leaf_scores
+        score = scores.get(history[-1][0]) if history and history[-1][3] == parent else None  # Reached by one move
+        return score if score is not None else game.evaluate(state)
+
+    # QUIESCENCE
+    def order_captures(self, state, captures):
+        """Order captures by most valuable victim (or promotion), then least valuable attacker."""
+        squares = state['board'].squares
+        captures.sort(
+            key=lambda move: (WEIGHTS[squares[move >> 6 & 63] & KIND_MASK] + WEIGHTS[move >> 12]) * 64
+            - WEIGHTS[squares[move & 63] & KIND_MASK],
+            reverse=True
+        )
+        return captures
+
+    def losing(self, state, action):
+        """Test whether a capture gives up more than it wins, judged from the board's attack maps."""
+        return state['board'].exchange(action) < 0
+
+    def quiesce_max(self, game, state, alpha, beta):
+        """Search captures only until the position is quiet, for the maximizing player."""
+        self.check_time()
+        self.stats.qnodes += 1
+        self.stats.leaves += 1
+        board = state['board']
+        evading = board.in_check(board.side)
+        if evading:  # The player may not stand pat in check: every evasion is searched
+            captures = game.actions(state)
+            if not captures:  # Checkmate
+                return game.utility(state)
+            stand_pat = value = -inf
+        else:
+            stand_pat = self.stand_pat(game, state)  # The player may decline every capture
+            if stand_pat >= beta:
+                return stand_pat
+            captures = game.captures(state)
+            if not captures and game.is_terminal(state):  # Stalemate
+                return game.utility(state)
+            alpha = max(alpha, stand_pat)
+            value = stand_pat
+        squares = board.squares
+        for action in self.order_captures(state, captures):
+            gain = (WEIGHTS[squares[action >> 6 & 63] & KIND_MASK] + WEIGHTS[action >> 12]) * WEIGHT_SCALE
+            if not evading and (stand_pat + gain + Computer.DELTA_MARGIN <= alpha or self.losing(state, action)):
+                continue  # Delta pruning
+            successor = self.quiesce_min(game, game.result(state, action), alpha, beta)
+            game.undo(state)
+            if successor > value:
+                value = successor
+                alpha = max(alpha, value)
+            if value >= beta:
+                break
+        return value
+
+    def quiesce_min(self, game, state, alpha, beta):
+        """Search captures only until the position is quiet, for the minimizing player."""
+        self.check_time()
+        self.stats.qnodes += 1
+        self.stats.leaves += 1
+        board = state['board']
+        evading = board.in_check(board.side)
+        if evading:  # The opponent may not stand pat in check: every evasion is searched
+            captures = game.actions(state)
+            if not captures:  # Checkmate
+                return game.utility(state)
+            stand_pat = value = inf
+        else:
+            stand_pat = self.stand_pat(game, state)  # The opponent may decline every capture
+            if stand_pat <= alpha:
+                return stand_pat
+            captures = game.captures(state)
+            if not captures and game.is_terminal(state):  # Stalemate
+                return game.utility(state)
+            beta = min(beta, stand_pat)
+            value = stand_pat
+        squares = board.squares
+        for action in self.order_captures(state, captures):
+            gain = (WEIGHTS[squares[action >> 6 & 63] & KIND_MASK] + WEIGHTS[action >> 12]) * WEIGHT_SCALE
+            if not evading and (stand_pat - gain - Computer.DELTA_MARGIN >= beta or self.losing(state, action)):
+                continue  # Delta pruning
+            successor = self.quiesce_max(game, game.result(state, action), alpha, beta)
+            game.undo(state)
+            if successor < value:
+                value = successor
+                beta = min(beta, value)
+            if value <= alpha:
+                break
+        return value
+
+# WORKER PROCESSES
+_workers = {}  # Game and players of a worker process, by team
+
+def _init_worker(hash_size, tablebases, game_class, settings, stop_event):
+    """Set up a worker process with its own game per team, sharing no pieces with its owner.
+
+    The game is of the owner's class, given as a `package.module:Class` path, and settings are its (pvs, aspiration).
+    """
+    module, _, name = game_class.partition(':')
+    game_class = getattr(import_module(module), name)
+    for team, other in ((TEAM_WHITE, TEAM_BLACK), (TEAM_BLACK, TEAM_WHITE)):
+        computer = Computer(team, new_set(team), hash_size=hash_size, tablebases=tablebases)
+        computer.pvs, computer.aspiration = settings
+        computer.stop_signal = stop_event
+        opponent = Player(other, new_set(other))
+        _workers[team] = game_class(computer, opponent, ChessBoard()), computer, opponent
+
+def _search_root_moves(snapshot, team, root_moves, move_time, max_depth, max_nodes=None):
+    """Search a share of the root moves in a worker process; return (depth, score, move) per iteration and nodes."""
+    game, computer, opponent = _workers[team]
+    game.board.restore(snapshot)
+    computer.move_time, computer.max_depth, computer.max_nodes = move_time, max_depth, max_nodes
+    computer.root_moves = root_moves
+    computer.alpha_beta_search(game, {'board': game.board, 'player': computer, 'opponent': opponent}, 0)
+    return computer.stats.results, computer.stats.nodes
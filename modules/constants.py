@@ -10,3 +10,30 @@ BOARD_WIDTH = 8
 BOARD_POSIT = [f"{file}{rank}" for file in FILE_LETTERS for rank in RANK_NUMBERS]
 BOARD_FILES = [list(group) for _, group in groupby(BOARD_POSIT, key=lambda pos: pos[0])]
 BOARD_RANKS = [list(col) for col in zip(*BOARD_FILES)]
+
+# Squares are integers 0..63 inside the engine (a1 = 0, h1 = 7, a8 = 56, h8 = 63).
+# Algebraic names are only used when reading input and displaying the board.
+BOARD_SIZE = BOARD_WIDTH * BOARD_WIDTH
+SQUARE_NAMES = [f"{file}{rank}" for rank in RANK_NUMBERS for file in FILE_LETTERS]
+SQUARES = {name: square for square, name in enumerate(SQUARE_NAMES)}
+
+# Piece codes are small integers: the low three bits hold the piece kind and
+# the fourth bit holds the side.
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+KIND_MASK = 7
+WHITE = 0
+BLACK = 8
+
+SIDE = {TEAM_WHITE: WHITE, TEAM_BLACK: BLACK}
+TEAM = {WHITE: TEAM_WHITE, BLACK: TEAM_BLACK}
+PIECE_NAMES = {PAWN: 'Pawn', KNIGHT: 'Knight', BISHOP: 'Bishop', ROOK: 'Rook', QUEEN: 'Queen', KING: 'King'}
+PIECE_KINDS = {name: kind for kind, name in PIECE_NAMES.items()}
+PIECE_LETTERS = {PAWN: 'P', KNIGHT: 'N', BISHOP: 'B', ROOK: 'R', QUEEN: 'Q', KING: 'K'}  # White's FEN letters
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# Castling rights, one bit each, in FEN order
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+CASTLING_LETTERS = "KQkq"
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
@@ -0,0 +1,48 @@
+"""Defines EPD reading and writing.
+
+An EPD record is the first four fields of FEN followed by operations, each an
+opcode and its operands closed by a semicolon, such as
+`r1b1k2r/... w kq - bm Nf3; id "WAC.001";`. The hmvc and fmvn operations carry
+the move counters that FEN keeps in its last two fields.
+"""
+
+import re
+
+_TOKENS = re.compile(r'"([^"]*)"|(;)|([^\s;"]+)')  # Quoted operand, terminator or bare word
+
+def parse_epd(line):
+    """Split an EPD record into its FEN and its operations, as {opcode: [operands]}."""
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"EPD needs at least 4 fields: {line!r}")
+    operations, opcode = {}, None
+    for match in _TOKENS.finditer(fields[4] if len(fields) > 4 else ''):
+        quoted, end, word = match.groups()
+        if end:
+            opcode = None
+        elif opcode is None:
+            if word is None:
+                raise ValueError(f"EPD operation without an opcode: {line!r}")
+            opcode = word
+            operations[opcode] = []
+        else:
+            operations[opcode].append(quoted if word is None else word)
+    halfmove = operations.get('hmvc', ['0'])[0]
+    fullmove = operations.get('fmvn', ['1'])[0]
+    return f"{' '.join(fields[:4])} {halfmove} {fullmove}", operations
+
+def format_epd(board, operations=None):
+    """Return the board's position as an EPD record with operations."""
+    fields = board.to_fen().split()[:4]
+    for opcode, operands in (operations or {}).items():
+        words = [f'"{operand}"' if not operand or re.search(r'[\s;"]', operand) else operand for operand in operands]
+        fields.append(f"{' '.join([opcode, *words])};")
+    return ' '.join(fields)
+
+def read_epd(path):
+    """Yield the (FEN, operations) of each record in an EPD file, skipping blank and # lines."""
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield parse_epd(line)
@@ -0,0 +1,141 @@
+"""Defines batched leaf evaluation.
+
+BatchGame adds pawn structure to the evaluation: doubled, isolated and passed
+pawns. Scoring these for one leaf at a time costs a Python loop per leaf, so
+at the last ply, once a node's first child has failed to cut off, the search
+scores the remaining children together. Each child is encoded as a vector of
+64 piece codes, written from its parent's without playing the move, and NumPy
+scores the whole batch with table lookups and pawn planes. NumPy is optional. Without
+it, BatchGame scores each position on its own, to the same values.
+
+Positions evaluated one at a time, such as quiescence's stand-pat scores, look
+their pawn structure up by the board's pawn key. Captures seldom change the
+pawns, so most of these skip the Python loop.
+
+Pass `game=modules.evaluation:BatchGame` to the match runner to measure it.
+"""
+
+from .chessboard import CASTLING_ROOKS, VALUES
+from .constants import BLACK, BOARD_SIZE, BOARD_WIDTH, EMPTY, KIND_MASK, KING, PAWN, SIDE, WHITE
+from .game import Game
+
+try:
+    import numpy
+except ImportError:  # Positions are scored one at a time instead
+    numpy = None
+
+DOUBLED_PAWN = -8  # Per pawn beyond the first on a file, in tenths of a weight
+ISOLATED_PAWN = -6  # Per pawn with no friendly pawn on a neighbouring file
+PASSED_PAWN = (0, 4, 6, 10, 16, 26, 40, 0)  # By ranks advanced, for a pawn no enemy pawn can stop
+
+def pawn_structure(squares):
+    """Score the pawn structure of a position from White's point of view, one square at a time."""
+    files = {WHITE: [[] for _ in range(BOARD_WIDTH)], BLACK: [[] for _ in range(BOARD_WIDTH)]}  # Pawn ranks, by file
+    for square, code in enumerate(squares):
+        if code == PAWN | WHITE or code == PAWN | BLACK:
+            files[code & BLACK][square & 7].append(square >> 3)
+    score = 0
+    for side, sign in ((WHITE, 1), (BLACK, -1)):
+        own, enemy = files[side], files[side ^ BLACK]
+        for file, ranks in enumerate(own):
+            if not ranks:
+                continue
+            neighbours = range(max(file - 1, 0), min(file + 2, BOARD_WIDTH))
+            term = DOUBLED_PAWN * (len(ranks) - 1)
+            if not any(own[other] for other in neighbours if other != file):
+                term += ISOLATED_PAWN * len(ranks)
+            blockers = [rank for other in neighbours for rank in enemy[other]]
+            for rank in ranks:
+                if side == WHITE and all(blocker <= rank for blocker in blockers):
+                    term += PASSED_PAWN[rank]
+                elif side == BLACK and all(blocker >= rank for blocker in blockers):
+                    term += PASSED_PAWN[7 - rank]
+            score += sign * term
+    return score
+
+if numpy is not None:
+    _VALUES = numpy.array(VALUES, dtype=numpy.int32)  # Indexed by piece code then square
+    _SQUARES = numpy.arange(BOARD_SIZE)
+    _RANKS = numpy.arange(BOARD_WIDTH).reshape(1, BOARD_WIDTH, 1)
+    _PASSED = numpy.array(PASSED_PAWN, dtype=numpy.int32).reshape(1, BOARD_WIDTH, 1)  # By White's rank
+
+    def _neighbourhood(per_file, reduce):
+        """Combine a (positions, files) array with its neighbouring files."""
+        combined = per_file.copy()
+        reduce(combined[:, 1:], per_file[:, :-1], out=combined[:, 1:])
+        reduce(combined[:, :-1], per_file[:, 1:], out=combined[:, :-1])
+        return combined
+
+    def _pawn_terms(counts, neighbour_counts):
+        """Return the doubled and isolated pawn terms of one side, from its pawns per file."""
+        doubled = numpy.maximum(counts - 1, 0).sum(axis=1) * DOUBLED_PAWN
+        isolated = (counts * (neighbour_counts == counts)).sum(axis=1) * ISOLATED_PAWN
+        return doubled + isolated
+
+    def evaluate_positions(positions):
+        """Score an (n, 64) array of piece codes from White's point of view, all positions at once."""
+        material = _VALUES[positions, _SQUARES].sum(axis=1)
+        planes = positions.reshape(-1, BOARD_WIDTH, BOARD_WIDTH)  # [position, rank, file]
+        white, black = planes == PAWN | WHITE, planes == PAWN | BLACK
+        white_counts, black_counts = white.sum(axis=1), black.sum(axis=1)
+        score = material + _pawn_terms(white_counts, _neighbourhood(white_counts, numpy.add))
+        score -= _pawn_terms(black_counts, _neighbourhood(black_counts, numpy.add))
+        # A pawn is passed when every enemy pawn on its own and neighbouring files is level or behind it
+        black_front = _neighbourhood(numpy.where(black, _RANKS, -1).max(axis=1), numpy.maximum)
+        white_front = _neighbourhood(numpy.where(white, _RANKS, BOARD_WIDTH).min(axis=1), numpy.minimum)
+        white_passed = white & (_RANKS >= black_front[:, None, :])
+        black_passed = black & (_RANKS <= white_front[:, None, :])
+        score += (white_passed * _PASSED).sum(axis=(1, 2))
+        score -= (black_passed * _PASSED[:, ::-1]).sum(axis=(1, 2))
+        return score
+
+class BatchGame(Game):
+    """A game evaluated with pawn structure, scoring the leaves at the last ply in batches."""
+
+    batched = numpy is not None
+    PAWN_TABLE_SIZE = 1 << 16  # Pawn structures cached, cleared when full
+
+    def __init__(self, player_one, player_two, chessboard, fen=None):
+        super().__init__(player_one, player_two, chessboard, fen)
+        self.pawn_table = {}  # Pawn structure scores, by pawn key
+
+    # EVALUATE
+    def evaluate(self, state):
+        """Evaluate the board state, pawn structure included, looking the pawns up by their key."""
+        board = state['board']
+        pawns = self.pawn_table.get(board.pawn_key)
+        if pawns is None:
+            if len(self.pawn_table) >= BatchGame.PAWN_TABLE_SIZE:
+                self.pawn_table.clear()
+            pawns = self.pawn_table[board.pawn_key] = pawn_structure(board.squares)
+        score = board.score + pawns
+        return score if SIDE[state['player'].team] == WHITE else -score
+
+    def encode_children(self, state, actions):
+        """Return the positions the actions lead to as 64 piece codes each, for evaluate_batch, without playing them."""
+        board = state['board']
+        parent, ep = bytes(board.squares), board.ep
+        positions = []
+        for action in actions:
+            fr, to, promotion = action & 63, action >> 6 & 63, action >> 12
+            child = bytearray(parent)
+            piece = child[fr]
+            child[to] = promotion | piece & BLACK if promotion else piece
+            child[fr] = EMPTY
+            if piece & KIND_MASK == PAWN and to == ep:  # En passant takes the pawn behind
+                child[to ^ 8] = EMPTY
+            elif piece & KIND_MASK == KING and to - fr in (2, -2):  # Castling brings the Rook across
+                rook_fr, rook_to = CASTLING_ROOKS[to]
+                child[rook_to], child[rook_fr] = child[rook_fr], EMPTY
+            positions.append(child)
+        return positions
+
+    def evaluate_batch(self, state, positions):
+        """Evaluate encoded positions together, from the point of view of the state's player."""
+        if numpy is None:
+            scores = [sum(VALUES[code][square] for square, code in enumerate(position)) + pawn_structure(position)
+                      for position in positions]
+        else:
+            array = numpy.frombuffer(b''.join(positions), dtype=numpy.uint8).reshape(-1, BOARD_SIZE)
+            scores = evaluate_positions(array).tolist()
+        return scores if SIDE[state['player'].team] == WHITE else [-score for score in scores]
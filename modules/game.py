@@ -1,73 +1,85 @@
 """Defines the game process."""
 
-from copy import deepcopy
-from itertools import chain
-from .constants import BOARD_POSIT, TEAM_WHITE
+from .chessboard import decode_move
+from .constants import QUEEN, SIDE, SQUARES, TEAM_WHITE, WHITE
 from .pieces import *
 
 class Game:
     """A game of chess."""
 
-    WINNER = None
-
-    def __init__(self, player_one, player_two, chessboard):
-        """Initialize game."""
-        chessboard.setup(player_one.pieces, player_two.pieces)
+    MATE = 1000000  # Score of delivering checkmate, less the plies from the search's root to reach it
+    batched = False  # Whether the search should score the leaves at the last ply with evaluate_batch
+
+    def __init__(self, player_one, player_two, chessboard, fen=None):
+        """Initialize game, from the initial position or from FEN."""
+        if fen is None:
+            chessboard.setup(player_one.pieces, player_two.pieces)
+        else:  # The players take the pieces standing on the board
+            white, black = chessboard.load_fen(fen)
+            for player in (player_one, player_two):
+                player.pieces = white if player.team == TEAM_WHITE else black
         self.P1 = player_one
+        self.winner = None  # Set when the game ends, left None by stalemate
         self.P2 = player_two
         self.board = chessboard
         self.turn = player_one \
-            if player_one.team == TEAM_WHITE \
+            if SIDE[player_one.team] == chessboard.side \
             else player_two
 
     # ACTIONS
     def actions(self, state):
-        """Return the set of legal moves."""
-        legal_moves = set()
-        for piece_type in state['player'].pieces.values():
-            for piece in piece_type:
-                for pos in BOARD_POSIT:
-                    if state['board'].legal_move(piece.pos, pos, state['player']):
-                        legal_moves.add((piece.pos, pos))
-        return legal_moves
+        """Return the legal moves."""
+        return state['board'].legal_moves(state['board'].side)
+
+    # CAPTURES
+    def captures(self, state):
+        """Return the legal captures."""
+        return state['board'].legal_moves(state['board'].side, captures=True)
 
     # EVALUATE
     def evaluate(self, state):
         """Evaluate the board state."""
-        return sum((
-            Pawn.WEIGHT * (len(state['player'].pieces['Pawn']) - len(state['opponent'].pieces['Pawn'])),
-            Rook.WEIGHT * (len(state['player'].pieces['Rook']) - len(state['opponent'].pieces['Rook'])),
-            Knight.WEIGHT * (len(state['player'].pieces['Knight']) - len(state['opponent'].pieces['Knight'])),
-            Bishop.WEIGHT * (len(state['player'].pieces['Bishop']) - len(state['opponent'].pieces['Bishop'])),
-            Queen.WEIGHT * (len(state['player'].pieces['Queen']) - len(state['opponent'].pieces['Queen']))
-        ))
+        score = state['board'].score  # Kept up to date as moves are made and unmade
+        return score if SIDE[state['player'].team] == WHITE else -score
+
+    def play(self, player, opponent, fr, to, feedback=False, promotion=QUEEN):
+        """Move a player's piece, keeping both players' piece lists in step with the board."""
+        piece = self.board.get(fr)
+        captured = self.board.move(fr, to, feedback, promotion)
+        if captured:
+            player.pieces_won.add(captured)
+            opponent.pieces.remove(captured)
+        promoted = self.board.get(to)
+        if promoted is not piece:
+            player.pieces.remove(piece)
+            player.pieces.add(promoted)
+        return captured
 
     def loop_one(self):
         """Loop through a one-player game."""
         while True:
             print(f"\n{self.turn.team} TO PLAY")
-            self.board.display()
+            self.board.display(self.P1.team)
             if self.turn is self.P1:  # Player turn
+                if self.P2.ponder:  # Think about the expected reply while the player does
+                    self.P2.start_pondering(self, {'board': self.board, 'opponent': self.P1, 'player': self.P2})
                 while True:
-                    fr, to = input("\nMove: ").split()
+                    fr, to = map(SQUARES.get, input("\nMove: ").lower().split())
                     if self.board.legal_move(fr, to, self.P1, True):
-                        if captured := self.board.move(fr, to, True):
-                            self.P1.pieces_won.add(captured)
-                            self.P2.pieces[captured.name].remove(captured)
+                        self.play(self.P1, self.P2, fr, to, True)
                         break
                     else:
                         print("Please try again.\n")
             else:  # Computer turn
+                self.P2.stop_pondering(self.board)
                 state = {
-                    'board': deepcopy(self.board),
-                    'max_depth': 3,
-                    'opponent': deepcopy(self.P1),
-                    'player': deepcopy(self.P2)
+                    'board': self.board,
+                    'opponent': self.P1,
+                    'player': self.P2
                 }
-                fr, to = self.P2.alpha_beta_search(self, state, 0)
-                if captured := self.board.move(fr, to):
-                    self.P2.pieces_won.add(captured)
-                    self.P1.pieces[captured.name].remove(captured)
+                move = self.P2.choose_move(self, state, 0)
+                fr, to = decode_move(move)
+                self.play(self.P2, self.P1, fr, to, promotion=move >> 12 or QUEEN)
 
             if self.turn is self.P1:
                 print("P2 King in check: ", self.board.king_in_check(self.P1, self.P2))
@@ -90,28 +102,34 @@ class Game:
                 print(piece, end=', ')
             print()
 
+            if self.board.king_in_checkmate(self.P1, self.P2):
+                self.winner = self.P1
+                break
+            elif self.board.king_in_checkmate(self.P2, self.P1):
+                self.winner = self.P2
+                break
+            elif self.board.king_in_stalemate(self.P1 if self.turn is self.P2 else self.P2, self.turn):
+                self.winner = None
+                break
+
     def loop_two(self):
         """Loop through a two-player game."""
         while True:
             print(f"\n{self.turn.team} TO PLAY")
-            self.board.display()
+            self.board.display(self.P1.team)
             if self.turn is self.P1:  # P1 turn
                 while True:
-                    fr, to = input("\nMove: ").split()
+                    fr, to = map(SQUARES.get, input("\nMove: ").lower().split())
                     if self.board.legal_move(fr, to, self.P1, True):
-                        if captured := self.board.move(fr, to, True):
-                            self.P1.pieces_won.add(captured)
-                            self.P2.pieces[captured.name].remove(captured)
+                        self.play(self.P1, self.P2, fr, to, True)
                         break
                     else:
                         print("Please try again.\n")
             else:  # P2 turn
                 while True:
-                    fr, to = input("\nMove: ").split()
+                    fr, to = map(SQUARES.get, input("\nMove: ").lower().split())
                     if self.board.legal_move(fr, to, self.P2, True):
-                        if captured := self.board.move(fr, to, True):
-                            self.P2.pieces_won.add(captured)
-                            self.P1.pieces[captured.name].remove(captured)
+                        self.play(self.P2, self.P1, fr, to, True)
                         break
                     else:
                         print("Please try again.\n")
@@ -138,16 +156,20 @@ class Game:
             print()
 
             if self.board.king_in_checkmate(self.P1, self.P2):
-                Game.WINNER = self.P1
+                self.winner = self.P1
                 break
             elif self.board.king_in_checkmate(self.P2, self.P1):
-                Game.WINNER = self.P2
+                self.winner = self.P2
+                break
+            elif self.board.king_in_stalemate(self.P1 if self.turn is self.P2 else self.P2, self.turn):
+                self.winner = None
                 break
 
     def play_one(self):
         """Play a one-player game."""
         print("\nGAME START")
         self.loop_one()
+        self.P2.stop_pondering(self.board)  # The game may end on the player's move
 
     def play_two(self):
         """Play a two-player game."""
@@ -157,39 +179,41 @@ class Game:
     # IS-CUTOFF
     def is_cutoff(self, state, depth):
         """Test for cut-off in game tree."""
-        return depth == state['max_depth']
+        return depth >= state['max_depth']
 
     # IS-TERMINAL
     def is_terminal(self, state):
-        """Test for terminal in game tree."""
-        return self.board.king_in_checkmate(state['player'], state['opponent'])
+        """Test for terminal in game tree: the side to move has no legal move."""
+        board = state['board']
+        return not board.has_legal_move(board.side)
+
+    # UTILITY
+    def utility(self, state):
+        """Score a terminal state for the state's player: checkmate, sooner the better, or stalemate."""
+        board = state['board']
+        if not board.in_check(board.side):
+            return 0
+        score = Game.MATE - (len(board.history) - state['root'])  # Counted from the search's root
+        return -score if SIDE[state['player'].team] == board.side else score
 
     def report(self):
         """Report game statistics."""
         print("\nGAME END")
-        print(f"\n{Game.WINNER.team} WINS\n")
+        print("\nSTALEMATE\n" if self.winner is None else f"\n{self.winner.team} WINS\n")
 
     # RESULT
     def result(self, state, action):
-        """Return new state from action."""
-        player, opponent = deepcopy(state['opponent']), deepcopy(state['player'])
-        for piece_type in player.pieces:
-            player.pieces[piece_type].clear()
-        for piece_type in opponent.pieces:
-            opponent.pieces[piece_type].clear()
-        board = deepcopy(state['board'])
-        fr, to = action
-        board.move(fr, to)
-        for pos in BOARD_POSIT:
-            piece = board.get(pos)
-            if piece is not None:
-                if piece.team == player.team:
-                    player.pieces[piece.name].append(piece)
-                else:
-                    opponent.pieces[piece.name].append(piece)
-        return {
-            'board': board,
-            'max_depth': state['max_depth'],
-            'opponent': opponent,
-            'player': player
-        }
+        """Play an action on the state in place."""
+        state['board'].make_move(action)
+        return state
+
+    # PASS
+    def pass_turn(self, state):
+        """Hand the move to the other player without moving (a null move)."""
+        state['board'].make_null_move()
+        return state
+
+    # UNDO
+    def undo(self, state):
+        """Take back the last action played on the state."""
+        state['board'].unmake_move()
@@ -0,0 +1,265 @@
+"""Defines the self-play match runner.
+
+Run `python3 -m modules.match --engine "max_depth=3" --engine "max_depth=4"` to
+play two engine configurations against each other, one game per worker process.
+An engine is a comma-separated list of Computer options, plus `computer=` and
+`game=` import paths (`package.module:Class`) to pit a changed search or
+evaluation against the current one. Each opening is played twice, with colours
+swapped, and the match stops as soon as a sequential probability ratio test
+decides between the two Elo hypotheses.
+"""
+
+import json
+import os
+from argparse import ArgumentParser
+from ast import literal_eval
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from importlib import import_module
+from inspect import signature
+from math import log, log10, sqrt
+from multiprocessing import get_context
+from time import monotonic
+from .chessboard import ChessBoard, move_name
+from .constants import BISHOP, BLACK, EMPTY, KIND_MASK, KING, KNIGHT, TEAM, WHITE
+from .epd import read_epd
+from .pieces import new_set
+from .player import Player
+
+MAX_PLIES = 400  # Plies before a game is adjudicated a draw
+OPENINGS = [  # Four plies into common openings
+    'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',  # e2e4 e7e5 g1f3 b8c6
+    'rnbqkbnr/pp2pppp/3p4/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 3',  # e2e4 c7c5 g1f3 d7d6
+    'rnbqkbnr/ppp2ppp/4p3/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq d6 0 3',  # e2e4 e7e6 d2d4 d7d5
+    'rnbqkbnr/pp2pppp/2p5/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq d6 0 3',  # e2e4 c7c6 d2d4 d7d5
+    'rnbqkbnr/ppp2ppp/4p3/3p4/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3',  # d2d4 d7d5 c2c4 e7e6
+    'rnbqkb1r/pppppp1p/5np1/8/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3',  # d2d4 g8f6 c2c4 g7g6
+    'rnbqkbnr/pp2pppp/2p5/3p4/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3',  # d2d4 d7d5 c2c4 c7c6
+    'rnbqkb1r/pppp1ppp/5n2/4p3/2P5/2N5/PP1PPPPP/R1BQKBNR w KQkq - 2 3',  # c2c4 e7e5 b1c3 g8f6
+    'rnbqkb1r/ppp1pppp/5n2/3p4/8/5NP1/PPPPPP1P/RNBQKB1R w KQkq - 1 3',  # g1f3 d7d5 g2g3 g8f6
+    'rnbqkb1r/pppp1ppp/5n2/4p3/2B1P3/8/PPPP1PPP/RNBQK1NR w KQkq - 2 3',  # e2e4 e7e5 f1c4 g8f6
+    'rnbqkb1r/pppp1ppp/4pn2/8/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3',  # d2d4 g8f6 c2c4 e7e6
+    'rnbqkb1r/ppp1pppp/3p1n2/8/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 1 3',  # e2e4 d7d6 d2d4 g8f6
+]
+
+def load(path):
+    """Import a class from a `package.module:Class` path."""
+    module, _, name = path.partition(':')
+    return getattr(import_module(module), name)
+
+def parse_engine(spec):
+    """Split an engine spec into its Computer class, Game class and options."""
+    options = {}
+    for item in filter(None, (item.strip() for item in spec.split(','))):
+        name, _, value = item.partition('=')
+        try:
+            options[name.strip()] = literal_eval(value.strip())
+        except (ValueError, SyntaxError):  # A bare word, such as a file name
+            options[name.strip()] = value.strip()
+    computer = load(options.pop('computer', 'modules.computer:Computer'))
+    game = load(options.pop('game', 'modules.game:Game'))
+    return computer, game, options
+
+def make_engine(spec, team, limits):
+    """Create the computer described by an engine spec, playing one team under the match limits."""
+    computer_class, game_class, options = parse_engine(spec)
+    options = {**limits, **options}
+    accepted = signature(computer_class).parameters
+    computer = computer_class(team, new_set(team), **{name: value for name, value in options.items() if name in accepted})
+    for name, value in options.items():
+        if name not in accepted:  # Search switches, such as pvs or aspiration
+            if not hasattr(computer, name):
+                raise ValueError(f"unknown engine option {name!r}")
+            setattr(computer, name, value)
+    return computer, game_class
+
+def insufficient_material(squares):
+    """Test whether neither side has the material to mate: bare Kings, or a single minor piece."""
+    pieces = [code & KIND_MASK for code in squares if code != EMPTY and code & KIND_MASK != KING]
+    return not pieces or len(pieces) == 1 and pieces[0] in (KNIGHT, BISHOP)
+
+def adjudicate(board, plies=0):
+    """Return (result for White, reason) if the game on the board is over, otherwise None."""
+    side = board.side
+    if not board.has_legal_move(side):
+        return (float(side == BLACK), 'checkmate') if board.in_check(side) else (0.5, 'stalemate')
+    if board.halfmove >= 100:
+        return 0.5, 'fifty-move rule'
+    if [record[3] for record in board.history].count(board.key) >= 2:
+        return 0.5, 'threefold repetition'
+    if insufficient_material(board.squares):
+        return 0.5, 'insufficient material'
+    if plies >= MAX_PLIES:
+        return 0.5, 'move limit'
+    return None
+
+def play_game(number, fen, white, black, limits, clock=None):
+    """Play one game between two engine specs; return its record, scored for White."""
+    board = ChessBoard()
+    board.load_fen(fen)
+    engines = {}
+    for side, spec in ((WHITE, white), (BLACK, black)):
+        computer, game_class = make_engine(spec, TEAM[side], limits)
+        opponent = Player(TEAM[side ^ BLACK], new_set(TEAM[side ^ BLACK]))
+        game = game_class(computer, opponent, board, fen)
+        engines[side] = game, computer, {'board': board, 'player': computer, 'opponent': opponent}
+    clocks = {side: clock[0] for side in engines} if clock is not None else None
+    moves, result, reason = [], None, None
+    while result is None:
+        if (ended := adjudicate(board, len(moves))) is not None:
+            result, reason = ended
+            break
+        side = board.side
+        legal = board.legal_moves(side)
+        game, computer, state = engines[side]
+        if clocks is not None:
+            computer.set_clock(clocks[side], clock[1])
+        start = monotonic()
+        move = computer.choose_move(game, state, 0)
+        if clocks is not None:
+            clocks[side] -= monotonic() - start
+            if clocks[side] < 0:
+                result, reason = float(side == BLACK), 'time forfeit'
+                break
+            clocks[side] += clock[1]
+        if move not in legal:
+            result, reason = float(side == BLACK), f"illegal move {move_name(move)}"
+            break
+        board.make_move(move)
+        moves.append(move_name(move))
+    for _, computer, _ in engines.values():
+        computer.close()
+    return {'game': number, 'opening': fen, 'white': white, 'black': black,
+            'result': result, 'reason': reason, 'moves': moves}
+
+class Tally:
+    """Results of a match, from the first engine's side, with its Elo estimate and SPRT."""
+
+    def __init__(self, elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05):
+        self.wins = self.draws = self.losses = 0
+        self.elo0, self.elo1 = elo0, elo1  # Elo differences of the null and alternative hypotheses
+        self.lower = log(beta / (1 - alpha))  # Accept the null hypothesis below this log-likelihood ratio
+        self.upper = log((1 - beta) / alpha)  # Accept the alternative above it
+
+    def __str__(self):
+        return (
+            f"{self.games()} games +{self.wins} ={self.draws} -{self.losses} "
+            f"elo {self.elo():+.1f} +/- {self.error():.1f} "
+            f"llr {self.llr():.2f} [{self.lower:.2f}, {self.upper:.2f}]"
+        )
+
+    def add(self, score):
+        """Count one game, scored 1, 0.5 or 0."""
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def games(self):
+        """Return the number of games counted."""
+        return self.wins + self.draws + self.losses
+
+    def score(self):
+        """Return the mean score per game."""
+        return (self.wins + self.draws / 2) / self.games() if self.games() else 0.5
+
+    def variance(self):
+        """Return the variance of a single game's score."""
+        if not self.games():
+            return 0.0
+        score = self.score()
+        return (
+            self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + self.losses * score ** 2
+        ) / self.games()
+
+    def elo(self, score=None):
+        """Return the Elo difference of a mean score, by default the match's."""
+        score = min(max(self.score() if score is None else score, 1e-6), 1 - 1e-6)
+        return -400 * log10(1 / score - 1)
+
+    def error(self):
+        """Return the half-width of the 95% confidence interval on the Elo difference."""
+        if not self.games():
+            return 0.0
+        margin = 1.96 * sqrt(self.variance() / self.games())
+        return (self.elo(self.score() + margin) - self.elo(self.score() - margin)) / 2
+
+    def llr(self):
+        """Return the log-likelihood ratio of elo1 over elo0, in the normal approximation."""
+        variance = self.variance()
+        if not variance:
+            return 0.0
+        score0, score1 = (1 / (1 + 10 ** (-elo / 400)) for elo in (self.elo0, self.elo1))
+        return (score1 - score0) * (2 * self.score() - score0 - score1) * self.games() / (2 * variance)
+
+    def decision(self):
+        """Return 'H1' or 'H0' once the test has decided, otherwise None."""
+        llr = self.llr()
+        return 'H1' if llr >= self.upper else 'H0' if llr <= self.lower else None
+
+def run_match(engine_a, engine_b, openings, games, limits, clock=None, workers=None, tally=None,
+              results=None, feedback=False):
+    """Play up to `games` games across worker processes, stopping early once the SPRT decides; return the tally."""
+    tally = tally if tally is not None else Tally()
+    start = monotonic()
+    # Spawned, as the search pool is, so each game starts from a clean interpreter
+    with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=get_context('spawn')) as pool:
+        pending = set()
+        for number in range(games):
+            fen = openings[number // 2 % len(openings)]
+            white, black = (engine_a, engine_b) if number % 2 == 0 else (engine_b, engine_a)
+            pending.add(pool.submit(play_game, number, fen, white, black, limits, clock))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                tally.add(record['result'] if record['game'] % 2 == 0 else 1 - record['result'])  # Even games: A has White
+                if results is not None:
+                    print(json.dumps(record), file=results, flush=True)
+                if feedback:
+                    rate = tally.games() * 3600 / (monotonic() - start)
+                    print(f"{tally} ({rate:.0f} games/h) game {record['game']}: {record['reason']}", flush=True)
+            if tally.decision() is not None:
+                for future in pending:
+                    future.cancel()  # Games already being played still finish
+                break
+    return tally
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Play engine configurations against each other and test for an Elo gain.")
+    parser.add_argument('--engine', action='append', default=[], help="engine spec; give two (the first is tested)")
+    parser.add_argument('--openings', help="EPD file of starting positions (default: a built-in list)")
+    parser.add_argument('--games', type=int, default=1000, help="most games to play")
+    parser.add_argument('--time', type=float, help="seconds per move")
+    parser.add_argument('--depth', type=int, help="plies per move")
+    parser.add_argument('--nodes', type=int, help="nodes per move")
+    parser.add_argument('--clock', help="game clock as seconds+increment, such as 10+0.1")
+    parser.add_argument('--workers', type=int, help="games played at once (default: one per core)")
+    parser.add_argument('--elo0', type=float, default=0.0, help="Elo difference of the null hypothesis")
+    parser.add_argument('--elo1', type=float, default=5.0, help="Elo difference of the alternative hypothesis")
+    parser.add_argument('--alpha', type=float, default=0.05, help="false positive rate")
+    parser.add_argument('--beta', type=float, default=0.05, help="false negative rate")
+    parser.add_argument('--results', help="file to append each game to as JSON lines")
+    args = parser.parse_args()
+    if len(args.engine) != 2:
+        parser.error("give exactly two --engine specs")
+    limits = {'move_time': args.time, 'max_depth': args.depth, 'max_nodes': args.nodes}
+    if args.time is None and args.depth is None and args.nodes is None and args.clock is None:
+        limits['move_time'] = 0.1
+    clock = None
+    if args.clock:
+        base, _, increment = args.clock.partition('+')
+        clock = float(base), float(increment or 0)
+    openings = [fen for fen, _ in read_epd(args.openings)] if args.openings else OPENINGS
+    results = open(args.results, 'a') if args.results else None
+    tally = run_match(
+        *args.engine, openings, args.games, limits, clock, args.workers,
+        Tally(args.elo0, args.elo1, args.alpha, args.beta), results, feedback=True
+    )
+    if results is not None:
+        results.close()
+    decision = tally.decision()
+    print(f"\n{tally}")
+    print({'H1': "H1 accepted: the first engine is stronger",
+           'H0': "H0 accepted: the first engine is not stronger"}.get(decision, "No decision"))
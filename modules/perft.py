@@ -0,0 +1,85 @@
+"""Defines the perft move generation benchmark.
+
+Run `python3 -m modules.perft [depth] [--divide]` to count the leaf nodes of
+the legal move tree from each standard position and compare them with the
+reference counts.
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+from .chessboard import ChessBoard, move_name
+from .constants import STARTING_FEN
+
+# Standard positions and their reference leaf counts, from depth 1 upwards
+POSITIONS = {
+    'startpos': (STARTING_FEN, (20, 400, 8902, 197281, 4865609)),
+    'kiwipete': (
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        (48, 2039, 97862, 4085603),
+    ),
+    'endgame': ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", (14, 191, 2812, 43238, 674624)),
+    'promotions': (
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        (6, 264, 9467, 422333),
+    ),
+    'talkchess': ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", (44, 1486, 62379, 2103487)),
+}
+
+def position(name):
+    """Set up a board on a standard position."""
+    board = ChessBoard()
+    board.load_fen(POSITIONS[name][0])
+    return board
+
+# PERFT
+def perft(board, depth):
+    """Count the leaf nodes of the legal move tree to a depth."""
+    if depth == 0:
+        return 1
+    moves = board.legal_moves(board.side)
+    if depth == 1:  # Bulk count: the legal moves are the leaves
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move()
+    return nodes
+
+# DIVIDE
+def divide(board, depth):
+    """Count the leaf nodes below each legal root move."""
+    counts = {}
+    for move in board.legal_moves(board.side):
+        board.make_move(move)
+        counts[move] = perft(board, depth - 1)
+        board.unmake_move()
+    return counts
+
+def run(depth, show_divide=False):
+    """Run the suite to a depth, reporting counts, speed and mismatches; return whether all counts match."""
+    passed = True
+    for name, (_, expected) in POSITIONS.items():
+        board = position(name)
+        print(f"\n{name}")
+        for ply in range(1, min(depth, len(expected)) + 1):
+            start = perf_counter()
+            if show_divide and ply == depth:
+                counts = divide(board, ply)
+                for move in sorted(counts, key=move_name):
+                    print(f"    {move_name(move)}: {counts[move]}")
+                nodes = sum(counts.values())
+            else:
+                nodes = perft(board, ply)
+            elapsed = perf_counter() - start
+            status = "ok" if nodes == expected[ply - 1] else f"MISMATCH (expected {expected[ply - 1]})"
+            passed = passed and nodes == expected[ply - 1]
+            print(f"  depth {ply}: {nodes} nodes in {elapsed:.3f}s ({nodes / max(elapsed, 1e-9):,.0f} nps) {status}")
+    return passed
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Count move generation leaf nodes from standard positions.")
+    parser.add_argument('depth', type=int, nargs='?', default=3, help="deepest ply to count")
+    parser.add_argument('--divide', action='store_true', help="show counts per root move at the deepest ply")
+    args = parser.parse_args()
+    raise SystemExit(0 if run(args.depth, args.divide) else 1)
@@ -1,18 +1,24 @@
 # Defines the chess pieces.
 
-from .chessboard import BOARD_WIDTH
-from .constants import TEAM_BLACK, TEAM_WHITE
+from .constants import *
 
 class ChessPiece():
     """A generic chesspiece."""
+    __slots__ = ('team', 'code', 'pos')
+    CODE = EMPTY  # Piece kind
+    ACTIONS = frozenset()  # (file, rank) steps, rank counted towards the opponent
+    SLIDES = False  # Whether each step repeats along a line
+    SQUARE_TABLE = (0,) * BOARD_SIZE  # Positional bonus in tenths of a weight, laid out from rank 8 down as White sees it
 
-    def __init__(self, team, actions):
+    def __init_subclass__(cls):
+        """Name each kind of chesspiece after its class, once rather than per piece."""
+        cls.name = cls.__name__
+
+    def __init__(self, team):
         """Defines a particular chesspiece."""
         self.team = team
-        self.actions = actions
-        self.moves = set()
+        self.code = self.CODE | SIDE[team]
         self.pos = None
-        self.name = self.__class__.__name__
 
     def __str__(self):
         """Returns a string representation of the chesspiece."""
@@ -21,68 +27,142 @@ class ChessPiece():
 # Standard chesspieces
 class Pawn(ChessPiece):
     """The Pawn chesspiece."""
+    __slots__ = ()
+    CODE = PAWN
     WEIGHT = 3
-    def __init__(self, team):
-        super().__init__(
-            team, {(-1, 1), (0, 1), (0, 2), (1, 1)}
-        ),
-        self.status = False
+    ACTIONS = frozenset({(-1, 1), (0, 1), (0, 2), (1, 1)})
+    SQUARE_TABLE = (
+        0,   0,   0,   0,   0,   0,   0,   0,
+       15,  15,  15,  15,  15,  15,  15,  15,
+        3,   3,   6,   9,   9,   6,   3,   3,
+        2,   2,   3,   8,   8,   3,   2,   2,
+        0,   0,   0,   6,   6,   0,   0,   0,
+        2,  -2,  -3,   0,   0,  -3,  -2,   2,
+        2,   3,   3,  -6,  -6,   3,   3,   2,
+        0,   0,   0,   0,   0,   0,   0,   0,
+    )
 
 class Rook(ChessPiece):
     """The Rook chesspiece."""
+    __slots__ = ()
+    CODE = ROOK
     WEIGHT = 16
-    def __init__(self, team):
-        super().__init__(
-            team, {(-1, 0), (0, -1), (0, 1), (1, 0)}
-        )
+    ACTIONS = frozenset({(-1, 0), (0, -1), (0, 1), (1, 0)})
+    SLIDES = True
+    SQUARE_TABLE = (
+        0,   0,   0,   0,   0,   0,   0,   0,
+        2,   3,   3,   3,   3,   3,   3,   2,
+       -2,   0,   0,   0,   0,   0,   0,  -2,
+       -2,   0,   0,   0,   0,   0,   0,  -2,
+       -2,   0,   0,   0,   0,   0,   0,  -2,
+       -2,   0,   0,   0,   0,   0,   0,  -2,
+       -2,   0,   0,   0,   0,   0,   0,  -2,
+        0,   0,   0,   2,   2,   0,   0,   0,
+    )
 
 class Knight(ChessPiece):
     """The Knight chesspiece."""
+    __slots__ = ()
+    CODE = KNIGHT
     WEIGHT = 24
-    def __init__(self, team):
-        super().__init__(
-            team, {(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)}
-        )
+    ACTIONS = frozenset({(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)})
+    SQUARE_TABLE = (
+      -15, -12,  -9,  -9,  -9,  -9, -12, -15,
+      -12,  -6,   0,   0,   0,   0,  -6, -12,
+       -9,   0,   3,   5,   5,   3,   0,  -9,
+       -9,   2,   5,   6,   6,   5,   2,  -9,
+       -9,   0,   5,   6,   6,   5,   0,  -9,
+       -9,   2,   3,   5,   5,   3,   2,  -9,
+      -12,  -6,   0,   2,   2,   0,  -6, -12,
+      -15, -12,  -9,  -9,  -9,  -9, -12, -15,
+    )
 
 class Bishop(ChessPiece):
     """The Bishop chesspiece."""
+    __slots__ = ()
+    CODE = BISHOP
     WEIGHT = 16
-    def __init__(self, team):
-        super().__init__(
-            team, {(-1, -1), (-1, 1), (1, -1), (1, 1)}
-        )
+    ACTIONS = frozenset({(-1, -1), (-1, 1), (1, -1), (1, 1)})
+    SLIDES = True
+    SQUARE_TABLE = (
+       -6,  -3,  -3,  -3,  -3,  -3,  -3,  -6,
+       -3,   0,   0,   0,   0,   0,   0,  -3,
+       -3,   0,   2,   3,   3,   2,   0,  -3,
+       -3,   2,   2,   3,   3,   2,   2,  -3,
+       -3,   0,   3,   3,   3,   3,   0,  -3,
+       -3,   3,   3,   3,   3,   3,   3,  -3,
+       -3,   2,   0,   0,   0,   0,   2,  -3,
+       -6,  -3,  -3,  -3,  -3,  -3,  -3,  -6,
+    )
 
 class Queen(ChessPiece):
     """The Queen chesspiece."""
+    __slots__ = ()
+    CODE = QUEEN
     WEIGHT = 40
-    def __init__(self, team):
-        super().__init__(
-            team, {(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)}
-        )
+    ACTIONS = frozenset({(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)})
+    SLIDES = True
+    SQUARE_TABLE = (
+       -6,  -3,  -3,  -2,  -2,  -3,  -3,  -6,
+       -3,   0,   0,   0,   0,   0,   0,  -3,
+       -3,   0,   2,   2,   2,   2,   0,  -3,
+       -2,   0,   2,   2,   2,   2,   0,  -2,
+        0,   0,   2,   2,   2,   2,   0,  -2,
+       -3,   2,   2,   2,   2,   2,   0,  -3,
+       -3,   0,   2,   0,   0,   0,   0,  -3,
+       -6,  -3,  -3,  -2,  -2,  -3,  -3,  -6,
+    )
 
 class King(ChessPiece):
     """The King chesspiece."""
+    __slots__ = ()
+    CODE = KING
     WEIGHT = 8
-    def __init__(self, team):
-        super().__init__(
-            team, {(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)}
-        )
+    ACTIONS = frozenset({(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)})
+    SQUARE_TABLE = (
+       -9, -12, -12, -15, -15, -12, -12,  -9,
+       -9, -12, -12, -15, -15, -12, -12,  -9,
+       -9, -12, -12, -15, -15, -12, -12,  -9,
+       -9, -12, -12, -15, -15, -12, -12,  -9,
+       -6,  -9,  -9, -12, -12,  -9,  -9,  -6,
+       -3,  -6,  -6,  -6,  -6,  -6,  -6,  -3,
+        6,   6,   0,   0,   0,   0,   6,   6,
+        6,   9,   3,   0,   0,   3,   9,   6,
+    )
 
 # Chesspiece sets
-black_set = {
-    'Pawn': [Pawn(TEAM_BLACK) for _ in range(BOARD_WIDTH)],
-    'Rook': [Rook(TEAM_BLACK), Rook(TEAM_BLACK)],
-    'Knight': [Knight(TEAM_BLACK), Knight(TEAM_BLACK)],
-    'Bishop': [Bishop(TEAM_BLACK), Bishop(TEAM_BLACK)],
-    'Queen': [Queen(TEAM_BLACK)],
-    'King': [King(TEAM_BLACK)]
-}
-
-white_set = {
-    'Pawn': [Pawn(TEAM_WHITE) for _ in range(BOARD_WIDTH)],
-    'Rook': [Rook(TEAM_WHITE), Rook(TEAM_WHITE)],
-    'Knight': [Knight(TEAM_WHITE), Knight(TEAM_WHITE)],
-    'Bishop': [Bishop(TEAM_WHITE), Bishop(TEAM_WHITE)],
-    'Queen': [Queen(TEAM_WHITE)],
-    'King': [King(TEAM_WHITE)]
-}
+class PieceSet:
+    """A team's chesspieces, listed by piece kind."""
+    __slots__ = ('team', 'kinds')
+
+    def __init__(self, team, pieces=()):
+        self.team = team
+        self.kinds = [[] for _ in range(KING + 1)]  # Indexed by piece kind
+        for piece in pieces:
+            self.add(piece)
+
+    def __getitem__(self, kind):
+        """Return the pieces of a kind."""
+        return self.kinds[kind]
+
+    def __iter__(self):
+        for pieces in self.kinds:
+            yield from pieces
+
+    def __len__(self):
+        return sum(len(pieces) for pieces in self.kinds)
+
+    def add(self, piece):
+        """Add a piece, such as a promoted Pawn's replacement."""
+        self.kinds[piece.CODE].append(piece)
+
+    def remove(self, piece):
+        """Remove a piece, such as one captured."""
+        self.kinds[piece.CODE].remove(piece)
+
+def new_set(team):
+    """Create a full set of chesspieces for a team, for one game."""
+    return PieceSet(team, [
+        *(Pawn(team) for _ in range(BOARD_WIDTH)),
+        Rook(team), Rook(team), Knight(team), Knight(team), Bishop(team), Bishop(team), Queen(team), King(team),
+    ])
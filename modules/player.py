@@ -2,6 +2,7 @@
 
 class Player:
     """The player."""
+    __slots__ = ('team', 'pieces', 'pieces_won', 'near')
 
     def __init__(self, team, pieces, near=False):
         self.team = team
@@ -0,0 +1,293 @@
+"""Defines the game server.
+
+Run `python3 -m modules.server --port 7777` to host human-vs-engine games over
+TCP, one command per line:
+
+    new [w|b] [FEN]     start a game, playing White or Black; answers `game <id> <FEN>`
+    move <id> <move>    play a move such as e2e4 or e7e8q; answers with the engine's `move <id> <move>`
+    show <id>           answers `fen <id> <FEN> clock <seconds>`
+    close <id>          end a game; answers `closed <id>`
+    stats               answers `stats` with the load metrics
+    quit                end the connection, and its games
+
+A finished game answers `result <id> <score> <reason>`, and a bad command
+`error <message>`. Each connection runs its own coroutine, while the engine
+searches run in a bounded pool of worker processes. Each engine gets a clock
+per game, spent only while it searches. Searches wait in a bounded queue. When
+the queue is full, the server stops reading from the clients waiting to add to
+it, so TCP slows them down, and games beyond `--max-games` are refused.
+"""
+
+import asyncio
+import os
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+from multiprocessing import get_context
+from time import monotonic
+from .chessboard import ChessBoard, move_name
+from .computer import Computer
+from .constants import SIDE, STARTING_FEN, TEAM_BLACK, TEAM_WHITE
+from .game import Game
+from .match import adjudicate
+from .pieces import new_set
+from .player import Player
+
+SCORES = {1.0: '1-0', 0.5: '1/2-1/2', 0.0: '0-1'}  # Results for White, as written in PGN
+
+class Session:
+    """A game hosted by the server: its board, the engine's side and the engine's clock."""
+
+    __slots__ = ('id', 'board', 'engine', 'clock', 'plies', 'result')
+
+    def __init__(self, id, board, engine, clock):
+        self.id = id
+        self.board = board
+        self.engine = engine  # Side the engine plays
+        self.clock = clock  # Seconds left for the engine's searches
+        self.plies = 0
+        self.result = None  # Set when the game ends
+
+    def adjudicate(self):
+        """Record and return the result line if the game is over, otherwise None."""
+        ended = adjudicate(self.board, self.plies)
+        if ended is None:
+            return None
+        self.result = f"result {self.id} {SCORES[ended[0]]} {ended[1]}"
+        return self.result
+
+class GameServer:
+    """Hosts many games at once, queueing their engine searches for a pool of worker processes."""
+
+    def __init__(self, workers=None, queue_size=64, max_games=1000, game_time=300.0, increment=2.0,
+                 hash_size=16, book=None, tablebases=None):
+        self.workers = workers or os.cpu_count()
+        self.queue = asyncio.Queue(queue_size)  # Searches waiting for a worker
+        self.max_games = max_games
+        self.game_time = game_time  # Seconds on each engine clock at the start of a game
+        self.increment = increment  # Seconds added to an engine clock per move
+        self.games = {}  # Sessions in play, by id
+        self.ids = count(1)
+        self.searching = 0  # Searches running in the pool
+        self.searches = 0  # Searches finished
+        self.refused = 0  # Games refused while full
+        self.waited = 0.0  # Seconds searches spent in the queue, in total
+        self.searched = 0.0  # Seconds searches spent in the pool, in total
+        self.peak_depth = 0  # Most searches ever queued at once
+        # Spawned, as the search pool is, so each worker starts from a clean interpreter
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=get_context('spawn'),
+                                        initializer=_init_engine, initargs=(hash_size, book, tablebases))
+        self.dispatchers = []
+
+    async def start(self, host='localhost', port=7777):
+        """Start the dispatchers and listen for connections; return the asyncio server."""
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        """Stop the dispatchers and shut down the worker processes."""
+        for task in self.dispatchers:
+            task.cancel()
+        self.pool.shutdown(cancel_futures=True)
+
+    def metrics(self):
+        """Return the load on the server."""
+        return {
+            'games': len(self.games),
+            'queued': self.queue.qsize(),
+            'peak_queued': self.peak_depth,
+            'searching': self.searching,
+            'workers': self.workers,
+            'searches': self.searches,
+            'refused': self.refused,
+            'mean_wait_ms': round(1000 * self.waited / max(self.searches, 1), 1),
+            'mean_search_ms': round(1000 * self.searched / max(self.searches, 1), 1),
+        }
+
+    async def handle(self, reader, writer):
+        """Answer the commands of one connection until it quits or closes."""
+        owned = set()  # Ids of the games started on this connection
+        next_line = asyncio.ensure_future(reader.readline())
+        task = None
+        try:
+            while line := await next_line:
+                # Read the next line while the command runs, to notice the client hanging up
+                next_line = asyncio.ensure_future(reader.readline())
+                task = asyncio.ensure_future(self.command(line.decode(errors='replace').split(), owned))
+                done, _ = await asyncio.wait((task, next_line), return_when=asyncio.FIRST_COMPLETED)
+                if task not in done and not await next_line:  # Gone: drop its queued search
+                    break
+                replies = await task
+                if replies is None:
+                    break
+                writer.write(''.join(f"{reply}\n" for reply in replies).encode())
+                await writer.drain()  # A client that stops reading stops being served
+        except ConnectionError:
+            pass
+        finally:
+            for pending in (task, next_line):
+                if pending is not None:
+                    pending.cancel()
+            for id in owned:
+                self.games.pop(id, None)
+            writer.close()
+
+    async def command(self, words, owned):
+        """Run one command; return its reply lines, or None on quit."""
+        if not words:
+            return []
+        command, args = words[0].lower(), words[1:]
+        if command == 'quit':
+            return None
+        if command == 'stats':
+            return ['stats ' + ' '.join(f"{name}={value}" for name, value in self.metrics().items())]
+        if command == 'new':
+            return await self.new_game(args, owned)
+        if command not in ('move', 'show', 'close'):
+            return [f"error unknown command {command!r}"]
+        session = self.games.get(int(args[0])) if args and args[0].isdigit() else None
+        if session is None or session.id not in owned:
+            return [f"error no game {args[0] if args else ''}".rstrip()]
+        if command == 'show':
+            return [f"fen {session.id} {session.board.to_fen()} clock {session.clock:.1f}"]
+        if command == 'close':
+            owned.discard(session.id)
+            del self.games[session.id]
+            return [f"closed {session.id}"]
+        if session.result is not None:
+            return [session.result]
+        board = session.board
+        move = next((move for move in board.legal_moves(board.side) if args[1:2] == [move_name(move)]), None)
+        if board.side == session.engine or move is None:
+            return [f"error illegal move {' '.join(args[1:2])}".rstrip()]
+        board.make_move(move)
+        session.plies += 1
+        return await self.reply(session)
+
+    async def new_game(self, args, owned):
+        """Start a game from `new [w|b] [FEN]`, the engine moving first if it is to play."""
+        if len(self.games) >= self.max_games:
+            self.refused += 1
+            return ["error server full"]
+        colour = args[0].lower() if args and args[0].lower() in ('w', 'b') else 'w'
+        fen = ' '.join(args[1:] if args and args[0].lower() in ('w', 'b') else args) or STARTING_FEN
+        board = ChessBoard()
+        try:
+            board.load_fen(fen)
+        except ValueError as error:
+            return [f"error {error}"]
+        engine = SIDE[TEAM_BLACK if colour == 'w' else TEAM_WHITE]
+        session = Session(next(self.ids), board, engine, self.game_time)
+        self.games[session.id] = session
+        owned.add(session.id)
+        replies = [f"game {session.id} {board.to_fen()}"]
+        if (result := session.adjudicate()) is not None:
+            return replies + [result]
+        return replies + (await self.reply(session) if board.side == engine else [])
+
+    async def reply(self, session):
+        """Adjudicate the human's move, then play and adjudicate the engine's; return the reply lines."""
+        if (result := session.adjudicate()) is not None:
+            return [result]
+        move, spent = await self.search(session)
+        if session.id not in self.games:  # Closed while the engine thought
+            return []
+        session.clock = max(0.0, session.clock - spent) + self.increment  # Past zero, the engine plays its first iteration
+        session.board.make_move(move)
+        session.plies += 1
+        replies = [f"move {session.id} {move_name(move)}"]
+        return replies + [result] if (result := session.adjudicate()) is not None else replies
+
+    async def search(self, session):
+        """Queue a search of the session's position; return the engine's move and the seconds it took."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((session, future, monotonic()))  # Waits while the queue is full
+        self.peak_depth = max(self.peak_depth, self.queue.qsize())
+        return await future
+
+    async def dispatch(self):
+        """Feed queued searches to the pool, one at a time, for as long as the server runs."""
+        loop = asyncio.get_running_loop()
+        while True:
+            session, future, queued = await self.queue.get()
+            try:
+                if future.cancelled():  # The client went away while it waited
+                    continue
+                start = monotonic()
+                self.waited += start - queued
+                self.searching += 1
+                try:
+                    result = await loop.run_in_executor(
+                        self.pool, _engine_move, session.board.snapshot(), session.clock, self.increment
+                    )
+                except Exception as error:
+                    if not future.cancelled():
+                        future.set_exception(error)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+                finally:
+                    self.searching -= 1
+                    self.searches += 1
+                    self.searched += monotonic() - start
+            finally:
+                self.queue.task_done()
+
+    async def report(self, interval):
+        """Print the metrics every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            print('stats ' + ' '.join(f"{name}={value}" for name, value in self.metrics().items()), flush=True)
+
+# WORKER PROCESSES
+_engines = {}  # Game and players of a worker process, by side to move
+
+def _init_engine(hash_size, book, tablebases):
+    """Set up a worker process with an engine per side, keeping its tables across the games it serves."""
+    for team, other in ((TEAM_WHITE, TEAM_BLACK), (TEAM_BLACK, TEAM_WHITE)):
+        computer = Computer(team, new_set(team), hash_size=hash_size, book=book, tablebases=tablebases)
+        opponent = Player(other, new_set(other))
+        _engines[SIDE[team]] = Game(computer, opponent, ChessBoard()), computer, opponent
+
+def _engine_move(snapshot, clock, increment):
+    """Choose a move for the side to move in a worker process; return it with the seconds spent."""
+    game, computer, opponent = _engines[snapshot[1]]
+    game.board.restore(snapshot)
+    computer.set_clock(clock, increment)
+    start = monotonic()
+    move = computer.choose_move(game, {'board': game.board, 'player': computer, 'opponent': opponent}, 0)
+    return move, monotonic() - start
+
+async def serve(args):
+    """Run the server until interrupted."""
+    game_server = GameServer(args.workers, args.queue, args.max_games, args.game_time, args.increment,
+                             args.hash, args.book, args.tablebases)
+    server = await game_server.start(args.host, args.port)
+    print(f"Serving on {args.host}:{args.port} with {game_server.workers} engine workers", flush=True)
+    reporter = asyncio.create_task(game_server.report(args.metrics)) if args.metrics else None
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        game_server.close()
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Host human-vs-engine games over a line protocol.")
+    parser.add_argument('--host', default='localhost', help="address to listen on")
+    parser.add_argument('--port', type=int, default=7777, help="port to listen on")
+    parser.add_argument('--workers', type=int, help="engine searches run at once (default: one per core)")
+    parser.add_argument('--queue', type=int, default=64, help="searches that may wait for a worker")
+    parser.add_argument('--max-games', type=int, default=1000, help="games hosted at once")
+    parser.add_argument('--game-time', type=float, default=300.0, help="seconds on the engine's clock per game")
+    parser.add_argument('--increment', type=float, default=2.0, help="seconds added to the engine's clock per move")
+    parser.add_argument('--hash', type=int, default=16, help="transposition table per worker, in MB")
+    parser.add_argument('--book', default='book.bin' if os.path.exists('book.bin') else None, help="opening book")
+    parser.add_argument('--tablebases', default='tablebases' if os.path.isdir('tablebases') else None,
+                        help="endgame tables directory")
+    parser.add_argument('--metrics', type=float, help="print the metrics every so many seconds")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,85 @@
+"""Defines the search statistics."""
+
+import json
+
+class SearchStats:
+    """Counters gathered during one search."""
+
+    def __init__(self):
+        self.nodes = 0  # Nodes visited
+        self.leaves = 0  # Leaf evaluations
+        self.qnodes = 0  # Quiescence nodes, counted among the nodes
+        self.cutoffs = 0  # Beta cutoffs
+        self.first_cutoffs = 0  # Beta cutoffs on the first move searched
+        self.null_cutoffs = 0  # Cutoffs proven by passing the turn
+        self.researches = 0  # Null-window and reduced searches repeated
+        self.aspiration_fails = 0  # Root searches repeated with a wider window
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tb_hits = 0  # Positions scored from the endgame tables
+        self.iterations = []  # (depth, nodes, seconds) per completed iteration
+        self.depth = 0  # Deepest completed iteration
+        self.score = None
+        self.results = []  # (depth, score, move) per completed iteration
+        self.pv = []  # Principal variation, as move names
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (
+            f"depth {self.depth} score {self.score} nodes {self.nodes} "
+            f"nps {self.nps():,.0f} ebf {self.branching_factor():.2f} "
+            f"first-cut {self.first_cutoff_rate():.0%} tt-hits {self.tt_hits}/{self.tt_probes} "
+            f"time {self.elapsed:.3f}s pv {' '.join(self.pv)}"
+        )
+
+    def complete_iteration(self, depth, elapsed):
+        """Record a finished iteration, given the seconds elapsed since the search began."""
+        counted = sum(nodes for _, nodes, _ in self.iterations)
+        spent = sum(seconds for _, _, seconds in self.iterations)
+        self.iterations.append((depth, self.nodes - counted, elapsed - spent))
+        self.depth = depth
+        self.elapsed = elapsed
+
+    def nps(self):
+        """Return nodes searched per second."""
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def first_cutoff_rate(self):
+        """Return the share of cutoffs caused by the first move searched."""
+        return self.first_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def branching_factor(self):
+        """Return the effective branching factor of the last two iterations."""
+        if len(self.iterations) < 2 or self.iterations[-2][1] == 0:
+            return 0.0
+        return self.iterations[-1][1] / self.iterations[-2][1]
+
+    def as_dict(self):
+        """Return the statistics as plain data."""
+        return {
+            'depth': self.depth,
+            'score': self.score,
+            'nodes': self.nodes,
+            'leaves': self.leaves,
+            'qnodes': self.qnodes,
+            'nps': round(self.nps()),
+            'cutoffs': self.cutoffs,
+            'first_cutoff_rate': round(self.first_cutoff_rate(), 4),
+            'null_cutoffs': self.null_cutoffs,
+            'researches': self.researches,
+            'aspiration_fails': self.aspiration_fails,
+            'branching_factor': round(self.branching_factor(), 3),
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tb_hits': self.tb_hits,
+            'iterations': [
+                {'depth': depth, 'nodes': nodes, 'seconds': round(seconds, 6)}
+                for depth, nodes, seconds in self.iterations
+            ],
+            'pv': self.pv,
+            'seconds': round(self.elapsed, 6),
+        }
+
+    def to_json(self):
+        """Return the statistics as one line of JSON."""
+        return json.dumps(self.as_dict())
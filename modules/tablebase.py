@@ -0,0 +1,357 @@
+"""Defines the endgame tablebases.
+
+A table holds every position of one material set, such as KQvK, with the
+strong side as White. Tables are built locally by retrograde analysis: mates
+are found first, and wins and losses are then propagated backwards one ply at a
+time by taking moves back, so each position learns its exact distance to mate.
+Captures and promotions leave the table and are resolved from smaller tables,
+which are built first.
+
+Each position is stored in one byte (see `encode`), for each side to move, and
+positions are reduced by the board's symmetries: the strong King is kept on
+files a-d, and without Pawns inside the a1-d1-d4 triangle.
+
+Run `python3 -m modules.tablebase DIRECTORY [KQvK KRvK ...] [--pieces N]` to
+build tables.
+"""
+
+import mmap
+import os
+from argparse import ArgumentParser
+from collections import defaultdict
+from itertools import combinations_with_replacement
+from time import perf_counter
+from .chessboard import RAYS, STEPS, ChessBoard
+from .constants import *
+
+MAX_PIECES = 4  # Most pieces in a table, Kings included
+MAGIC = b'CTB1'  # File header
+LETTERS = {QUEEN: 'Q', ROOK: 'R', BISHOP: 'B', KNIGHT: 'N', PAWN: 'P'}
+KINDS = {letter: kind for kind, letter in LETTERS.items()}
+ORDER = (QUEEN, ROOK, BISHOP, KNIGHT, PAWN)  # Strongest first
+
+# Position values: 0 is a draw, 1..127 a win and 128..254 a loss for the side to move
+DRAW = 0
+INVALID = 255  # Not a legal position
+
+def encode(wdl, dtm):
+    """Pack a result and its distance to mate in plies into one byte."""
+    if wdl > 0:
+        return (dtm + 1) // 2  # Wins end on the winner's move, an odd number of plies away
+    if wdl < 0:
+        return 128 + dtm // 2
+    return DRAW
+
+def decode(value):
+    """Unpack a byte into (result, distance to mate in plies), or None if the position is not legal."""
+    if value == INVALID:
+        return None
+    if value == DRAW:
+        return 0, 0
+    if value < 128:
+        return 1, 2 * value - 1
+    return -1, 2 * (value - 128)
+
+# Square symmetries
+_TRANSFORMS = [
+    [(sq & 7 ^ file_flip) | (sq >> 3 ^ rank_flip) << 3 for sq in range(BOARD_SIZE)]
+    for file_flip, rank_flip in ((0, 0), (7, 0), (0, 7), (7, 7))
+]
+_TRANSFORMS += [[transform[(sq & 7) << 3 | sq >> 3] for sq in range(BOARD_SIZE)] for transform in _TRANSFORMS]
+KING_HALF = [sq for sq in range(BOARD_SIZE) if sq & 7 < 4]  # Strong King squares with Pawns on the board
+KING_TRIANGLE = [sq for sq in range(BOARD_SIZE) if sq >> 3 <= sq & 7 < 4]  # Strong King squares without
+
+def name_of(strong, weak):
+    """Return the name of a material set, such as 'KRvKP'."""
+    return 'K' + ''.join(LETTERS[kind] for kind in strong) + 'vK' + ''.join(LETTERS[kind] for kind in weak)
+
+def parse_name(name):
+    """Return the (strong, weak) piece kinds of a material set name."""
+    strong, weak = name.upper().split('V')
+    return tuple(KINDS[letter] for letter in strong[1:]), tuple(KINDS[letter] for letter in weak[1:])
+
+def strength(kinds):
+    """Return a sort key under which the strong side of a material set comes out ahead."""
+    return len(kinds), tuple(len(ORDER) - ORDER.index(kind) for kind in kinds)
+
+def material_sets(pieces):
+    """List the names of every material set of up to a number of pieces, smallest first."""
+    names = []
+    for extra in range(1, pieces - 1):
+        for kinds in combinations_with_replacement(ORDER, extra):
+            for split in range(extra + 1):
+                strong, weak = kinds[:split], kinds[split:]
+                if strength(strong) >= strength(weak):
+                    names.append(name_of(strong, weak))
+    return list(dict.fromkeys(names))
+
+class Table:
+    """The positions of one material set, with the strong side as White."""
+
+    def __init__(self, name, data=None):
+        self.name = name
+        strong, weak = parse_name(name)
+        # Piece codes in index order: the strong King first, since it picks the symmetry
+        self.codes = [KING | WHITE, *(kind | WHITE for kind in strong), KING | BLACK, *(kind | BLACK for kind in weak)]
+        pawns = PAWN in strong or PAWN in weak
+        kings = KING_HALF if pawns else KING_TRIANGLE
+        self.slots = {sq: slot for slot, sq in enumerate(kings)}
+        self.kings = kings
+        self.transforms = _TRANSFORMS[:2] if pawns else _TRANSFORMS
+        self.size = len(kings) * BOARD_SIZE ** (len(self.codes) - 1)
+        self.data = bytearray([INVALID]) * (2 * self.size) if data is None else data
+
+    def index(self, squares, side):
+        """Return the index of a position, given its squares in code order.
+
+        Symmetric positions share the smallest of their indices, so every
+        position has exactly one.
+        """
+        best = None
+        for transform in self.transforms:
+            slot = self.slots.get(transform[squares[0]])
+            if slot is None:
+                continue
+            index = slot
+            for square in squares[1:]:
+                index = index * BOARD_SIZE + transform[square]
+            if best is None or index < best:
+                best = index
+        return best + (self.size if side == BLACK else 0)
+
+    def squares(self, index):
+        """Return the squares of the position at an index, in code order (the side is not included)."""
+        index %= self.size
+        squares = []
+        for _ in range(len(self.codes) - 1):
+            index, square = divmod(index, BOARD_SIZE)
+            squares.append(square)
+        squares.append(self.kings[index])
+        return squares[::-1]
+
+    def save(self, path):
+        """Write the table to a file."""
+        with open(path, 'wb') as file:
+            file.write(MAGIC)
+            file.write(self.data)
+
+class Tablebase:
+    """The tables in a directory, loaded when first probed."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}  # Loaded tables by name, or None when missing
+        names = [name[:-3] for name in os.listdir(directory) if name.endswith('.tb')] if os.path.isdir(directory) else []
+        # Most pieces of any table on disk, or 0 to never probe
+        self.max_pieces = max((len(name) - 1 for name in names), default=0)
+
+    def table(self, name):
+        """Return a table by name, or None if it has not been built."""
+        if name not in self.tables:
+            path = os.path.join(self.directory, f"{name}.tb")
+            if not os.path.exists(path):
+                self.tables[name] = None
+            else:
+                with open(path, 'rb') as file:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if data[:len(MAGIC)] != MAGIC:
+                    raise ValueError(f"{path} is not a tablebase file")
+                self.tables[name] = Table(name, memoryview(data)[len(MAGIC):])
+        return self.tables[name]
+
+    # PROBING
+    def lookup(self, pieces, side):
+        """Return (result, distance to mate) for the side to move, given (code, square) pairs."""
+        white, black = [], []
+        for code, square in pieces:
+            kind = code & KIND_MASK
+            if kind != KING:
+                (white if code & BLACK == WHITE else black).append((kind, square))
+        if not white and not black:
+            return 0, 0  # Bare Kings
+        white.sort(key=lambda piece: ORDER.index(piece[0]))
+        black.sort(key=lambda piece: ORDER.index(piece[0]))
+        kings = {code & BLACK: square for code, square in pieces if code & KIND_MASK == KING}
+        flip = 0
+        if strength([kind for kind, _ in white]) < strength([kind for kind, _ in black]):  # Black is strong: swap colours
+            white, black, flip = black, white, 56
+            kings = {WHITE: kings[BLACK], BLACK: kings[WHITE]}
+            side ^= BLACK
+        table = self.table(name_of([kind for kind, _ in white], [kind for kind, _ in black]))
+        if table is None:
+            return None
+        squares = [kings[WHITE] ^ flip, *(sq ^ flip for _, sq in white), kings[BLACK] ^ flip, *(sq ^ flip for _, sq in black)]
+        return decode(table.data[table.index(squares, side)])
+
+    def probe(self, board):
+        """Return (result, distance to mate) for the side to move, or None when out of the tables."""
+        squares = board.squares
+        if BOARD_SIZE - squares.count(EMPTY) > self.max_pieces:
+            return None
+        return self.lookup([(code, sq) for sq, code in enumerate(squares) if code != EMPTY], board.side)
+
+    def best_move(self, board):
+        """Return the move that keeps the best result soonest, or None when out of the tables."""
+        best, best_rank = None, None
+        for move in board.legal_moves(board.side):
+            board.make_move(move)
+            result = self.probe(board)
+            board.unmake_move()
+            if result is None:
+                return None
+            wdl, dtm = result
+            # Win soonest, else draw, else lose latest
+            rank = (-wdl, -dtm if wdl < 0 else dtm)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+    # GENERATION
+    def build(self, name, feedback=False):
+        """Build a table and any smaller table it leads to, writing them to the directory."""
+        strong, weak = (sorted(kinds, key=ORDER.index) for kinds in parse_name(name))
+        name = name_of(strong, weak)
+        if self.table(name) is not None:
+            return self.tables[name]
+        for who, kinds in enumerate((strong, weak)):  # Captures and promotions lead to smaller tables
+            for index, kind in enumerate(kinds):
+                smaller = [list(strong), list(weak)]
+                del smaller[who][index]
+                self._build_child(*smaller, feedback)
+                for promotion in PROMOTIONS if kind == PAWN else ():
+                    promoted = [list(strong), list(weak)]
+                    promoted[who][index] = promotion
+                    self._build_child(*promoted, feedback)
+        start = perf_counter()
+        table = Table(name)
+        self.generate(table)
+        os.makedirs(self.directory, exist_ok=True)
+        table.save(os.path.join(self.directory, f"{name}.tb"))
+        self.tables[name] = table
+        self.max_pieces = max(self.max_pieces, len(table.codes))
+        if feedback:
+            print(f"{name}: {len(table.data)} positions in {perf_counter() - start:.1f}s")
+        return table
+
+    def _build_child(self, strong, weak, feedback):
+        """Build the table of a material set reached by a capture or promotion."""
+        if strong or weak:
+            if strength(strong) < strength(weak):
+                strong, weak = weak, strong
+            self.build(name_of(sorted(strong, key=ORDER.index), sorted(weak, key=ORDER.index)), feedback)
+
+    def generate(self, table):
+        """Fill a table by retrograde analysis."""
+        codes, size, data = table.codes, table.size, table.data
+        counts = bytearray(2 * size)  # Moves not yet known to lose, per position
+        solved = bytearray(2 * size)
+        wins, decrements = defaultdict(list), defaultdict(list)  # Results of moves leaving the table, by ply
+        board = ChessBoard()
+        losses = []
+        for index in range(size):
+            squares = table.squares(index)
+            if len(set(squares)) < len(squares) or table.index(squares, WHITE) != index:
+                continue  # Overlapping pieces, or a symmetric duplicate
+            if any(code & KIND_MASK == PAWN and sq >> 3 in (0, 7) for code, sq in zip(codes, squares)):
+                continue
+            board.squares = [EMPTY] * BOARD_SIZE
+            for code, square in zip(codes, squares):
+                board.squares[square] = code
+            board.attacks = board.compute_attacks()
+            for side in (WHITE, BLACK):
+                if board.in_check(side ^ BLACK):
+                    continue
+                board.side = side
+                position = index + (size if side == BLACK else 0)
+                children, moves, exits, drawn = set(), 0, 0, False
+                for move in board.generate_moves(side):
+                    fr, to = move & 63, move >> 6 & 63
+                    captured = board.make_move(move)
+                    if not board.in_check(side):
+                        moves += 1
+                        if captured != EMPTY or move >> 12:  # Leaves the table
+                            pieces = [(code, sq) for sq, code in enumerate(board.squares) if code != EMPTY]
+                            wdl, dtm = self.lookup(pieces, side ^ BLACK)
+                            if wdl < 0:
+                                wins[dtm + 1].append(position)
+                            elif wdl > 0:
+                                decrements[dtm + 1].append(position)
+                                exits += 1
+                            else:
+                                drawn = True  # The side to move can always leave for a draw
+                        else:
+                            children.add(table.index([to if sq == fr else sq for sq in squares], side ^ BLACK))
+                    board.unmake_move()
+                if moves == 0:
+                    solved[position] = 1
+                    if board.in_check(side):
+                        data[position] = encode(-1, 0)
+                        losses.append(position)
+                    else:
+                        data[position] = DRAW
+                    continue
+                data[position] = DRAW  # Until proven otherwise
+                counts[position] = INVALID if drawn else exits + len(children)
+        # Propagate backwards: a position is won if a move reaches a loss, and lost once every move reaches a win
+        ply, found = 0, losses
+        last = max([*wins, *decrements], default=0)
+        while found or ply < last:
+            ply += 1
+            found_now = []
+            if ply % 2:
+                for position in [*self._predecessors(table, found), *wins.pop(ply, ())]:
+                    if not solved[position]:
+                        solved[position] = 1
+                        data[position] = encode(1, ply)
+                        found_now.append(position)
+            else:
+                for position in [*self._predecessors(table, found), *decrements.pop(ply, ())]:
+                    if not solved[position] and counts[position] != INVALID:
+                        counts[position] -= 1
+                        if counts[position] == 0:
+                            solved[position] = 1
+                            data[position] = encode(-1, ply)
+                            found_now.append(position)
+            found = found_now
+
+    def _predecessors(self, table, positions):
+        """Yield each distinct position one move before the given positions, within the table."""
+        codes, size, data = table.codes, table.size, table.data
+        for position in positions:
+            squares = table.squares(position)
+            occupied = set(squares)
+            mover = WHITE if position >= size else BLACK  # The side that just moved
+            parents = set()
+            for piece, (code, square) in enumerate(zip(codes, squares)):
+                if code & BLACK != mover:
+                    continue
+                kind = code & KIND_MASK
+                if kind == PAWN:
+                    back = -8 if mover == WHITE else 8
+                    origins = [square + back] if square + back not in occupied else []
+                    if origins and square >> 3 == (3 if mover == WHITE else 4) and square + 2 * back not in occupied:
+                        origins.append(square + 2 * back)
+                elif kind in STEPS:
+                    origins = [fr for fr in STEPS[kind][square] if fr not in occupied]
+                else:
+                    origins = []
+                    for ray in RAYS[kind][square]:
+                        for fr in ray:
+                            if fr in occupied:
+                                break
+                            origins.append(fr)
+                for fr in origins:
+                    parent = table.index(squares[:piece] + [fr] + squares[piece + 1:], mover)
+                    if data[parent] != INVALID:
+                        parents.add(parent)
+            yield from parents
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Build endgame tablebases by retrograde analysis.")
+    parser.add_argument('directory', help="directory to write the tables to")
+    parser.add_argument('names', nargs='*', default=['KQvK', 'KRvK', 'KPvK'], help="material sets to build")
+    parser.add_argument('--pieces', type=int, help=f"build every material set of up to this many pieces (at most {MAX_PIECES})")
+    args = parser.parse_args()
+    tablebase = Tablebase(args.directory)
+    for name in material_sets(min(args.pieces, MAX_PIECES)) if args.pieces else args.names:
+        tablebase.build(name, feedback=True)
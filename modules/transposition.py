@@ -0,0 +1,58 @@
+"""Defines the transposition table."""
+
+from array import array
+
+# Bound types
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+class TranspositionTable:
+    """A fixed-size table of search results, keyed by Zobrist key.
+
+    Entries live in buckets of two slots: the first keeps the deepest result
+    seen for its bucket, the second is always replaced.
+    """
+
+    ENTRY_SIZE = 16  # Bytes per entry: key (8), score (4), move (2), depth (1), bound (1)
+    BUCKET_SIZE = 2
+
+    def __init__(self, size_mb=16):
+        """Allocate a table of roughly the given size in megabytes."""
+        buckets = max(1, size_mb * 2 ** 20 // (TranspositionTable.ENTRY_SIZE * TranspositionTable.BUCKET_SIZE))
+        buckets = 1 << (buckets.bit_length() - 1)  # Round down to a power of two
+        self.mask = buckets - 1
+        self.clear()
+
+    def __len__(self):
+        """Return the number of slots in the table."""
+        return len(self.keys)
+
+    def clear(self):
+        """Forget every entry."""
+        entries = (self.mask + 1) * TranspositionTable.BUCKET_SIZE
+        self.keys = array('Q', bytes(8 * entries))
+        self.scores = array('i', bytes(4 * entries))
+        self.moves = array('H', bytes(2 * entries))
+        self.depths = array('b', bytes(entries))
+        self.bounds = array('B', bytes(entries))
+
+    def probe(self, key):
+        """Look up a position, returning (depth, bound, score, move) or None."""
+        slot = (key & self.mask) * TranspositionTable.BUCKET_SIZE
+        for slot in (slot, slot + 1):
+            if self.keys[slot] == key:
+                move = self.moves[slot]
+                return self.depths[slot], self.bounds[slot], self.scores[slot], move if move else None
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """Record a search result."""
+        slot = (key & self.mask) * TranspositionTable.BUCKET_SIZE
+        if self.keys[slot] != key and self.depths[slot] > depth:
+            slot += 1  # Keep the deeper result, overwrite the other slot
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.bounds[slot] = bound
+        self.scores[slot] = score
+        self.moves[slot] = move or 0
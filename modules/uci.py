@@ -0,0 +1,163 @@
+"""Defines the UCI (Universal Chess Interface) front-end.
+
+Run `python3 -m modules.uci` and talk to it over standard input and output, or
+register that command with a chess GUI. The search runs in a worker thread, so
+`stop`, `isready` and `quit` are answered while the engine thinks.
+"""
+
+import os
+import sys
+from threading import Thread
+from .chessboard import WEIGHT_SCALE, ChessBoard, move_name
+from .computer import Computer
+from .constants import *
+from .game import Game
+from .pieces import Pawn, new_set
+from .player import Player
+
+ENGINE_NAME = "chessbot"
+ENGINE_AUTHOR = "Ben"
+GO_LIMITS = ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo', 'nodes', 'mate')
+
+class UCI:
+    """A UCI session driving one engine."""
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.engine = Computer(TEAM_WHITE, new_set(TEAM_WHITE), move_time=None)
+        self.engine.report = self.info
+        self.opponent = Player(TEAM_BLACK, new_set(TEAM_BLACK))
+        self.game = Game(self.engine, self.opponent, ChessBoard(), STARTING_FEN)
+        self.thread = None  # The search in progress, if any
+
+    def send(self, line):
+        """Write one line to the GUI."""
+        print(line, file=self.output, flush=True)
+
+    def run(self, lines=sys.stdin):
+        """Answer commands until quit or the end of input."""
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop()
+        self.engine.close()
+
+    def handle(self, line):
+        """Answer one command; return False on quit."""
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {self.engine.hash_size} min 1 max 4096")
+            self.send(f"option name Threads type spin default 1 min 1 max {os.cpu_count() or 1}")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self.stop()
+            self.set_option(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            self.engine.table.clear()
+            self.engine.history = [0] * len(self.engine.history)
+        elif command == 'position':
+            self.stop()
+            self.position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            return False
+        return True  # Unknown commands are ignored, as the protocol asks
+
+    # COMMANDS
+    def set_option(self, args):
+        """Apply `setoption name <name> value <value>`."""
+        if 'name' not in args or 'value' not in args:
+            return
+        name = ' '.join(args[args.index('name') + 1:args.index('value')]).lower()
+        value = ' '.join(args[args.index('value') + 1:])
+        try:
+            if name == 'hash':
+                self.engine.set_hash_size(max(1, int(value)))
+            elif name == 'threads':
+                self.engine.close_pool()
+                self.engine.workers = max(1, int(value))
+        except ValueError:
+            self.send(f"info string invalid value {value!r} for {name}")
+
+    def position(self, args):
+        """Apply `position [startpos | fen <fen>] [moves <move> ...]`."""
+        moves = args[args.index('moves') + 1:] if 'moves' in args else []
+        args = args[:args.index('moves')] if 'moves' in args else args
+        board = self.game.board
+        try:
+            board.load_fen(STARTING_FEN if args[:1] == ['startpos'] else ' '.join(args[1:]))
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+        for name in moves:
+            move = next((move for move in board.legal_moves(board.side) if move_name(move) == name), None)
+            if move is None:
+                self.send(f"info string illegal move {name}")
+                return
+            board.make_move(move)
+
+    def go(self, args):
+        """Start a search under the limits of `go`, answering with bestmove when it ends."""
+        limits = {
+            word: int(value) for word, value in zip(args, args[1:])
+            if word in GO_LIMITS and value.lstrip('-').isdigit()
+        }
+        engine, board = self.engine, self.game.board
+        team = TEAM[board.side]
+        if engine.team != team:  # Stored scores are from the engine's side: they do not carry over
+            engine.team, self.opponent.team = team, TEAM[board.side ^ BLACK]
+            engine.table.clear()
+        engine.max_depth = limits.get('depth')
+        engine.max_nodes = limits.get('nodes')
+        engine.move_time = limits['movetime'] / 1000 if 'movetime' in limits else None
+        engine.clock = None
+        remaining, increment = ('wtime', 'winc') if board.side == WHITE else ('btime', 'binc')
+        if remaining in limits and 'infinite' not in args:
+            engine.set_clock(max(0, limits[remaining]) / 1000, limits.get(increment, 0) / 1000, limits.get('movestogo'))
+        engine.clear_stop()
+        self.thread = Thread(target=self.search, daemon=True)
+        self.thread.start()
+
+    def search(self):
+        """Search the position in the worker thread and report the move."""
+        state = {'board': self.game.board, 'player': self.engine, 'opponent': self.opponent}
+        move = self.engine.choose_move(self.game, state, 0)
+        self.send(f"bestmove {move_name(move) if move is not None else '0000'}")
+
+    def stop(self):
+        """End the search in progress, if any, once it has reported its move."""
+        if self.thread is not None:
+            self.engine.stop()
+            self.thread.join()
+            self.thread = None
+
+    def info(self, stats):
+        """Report a completed iteration."""
+        score = stats.score
+        if abs(score) > Game.MATE // 2:  # Checkmate found, scored from the search's root
+            plies = Game.MATE - abs(score)
+            score_text = f"mate {(plies + 1) // 2 if score > 0 else -(plies // 2)}"
+        elif abs(score) > Computer.TABLEBASE_WIN // 2:  # A tablebase win or loss
+            plies = Computer.TABLEBASE_WIN - abs(score)
+            score_text = f"mate {(plies + 1) // 2 if score > 0 else -(plies // 2)}"
+        else:
+            score_text = f"cp {round(score * 100 / (Pawn.WEIGHT * WEIGHT_SCALE))}"
+        self.send(
+            f"info depth {stats.depth} score {score_text} nodes {stats.nodes} nps {round(stats.nps())} "
+            f"time {round(stats.elapsed * 1000)} pv {' '.join(stats.pv)}"
+        )
+
+if __name__ == '__main__':
+    UCI().run()